@@ -56,6 +56,12 @@ class AppConfigDownloadsSerializer(
     cookie_import = serializers.BooleanField()
     pot_provider_url = serializers.CharField(allow_null=True)
     throttledratelimit = serializers.IntegerField(allow_null=True)
+    parallel_downloads = serializers.IntegerField(
+        allow_null=True, min_value=1, max_value=8
+    )
+    requests_per_minute = serializers.IntegerField(
+        allow_null=True, min_value=1
+    )
     extractor_lang = serializers.CharField(allow_null=True)
     integrate_ryd = serializers.BooleanField()
     integrate_sponsorblock = serializers.BooleanField()
@@ -1,24 +1,30 @@
 """
 Functionality:
 - Handle json zip file based backup
-- create backup
-- restore backup
+- create backup, streamed into zip archive
+- restore backup, streamed in chunks with concurrent bulk requests
 """
 
+import hashlib
+import io
 import json
 import os
 import re
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from time import sleep
 
 from common.src.env_settings import EnvironmentSettings
 from common.src.es_connect import ElasticWrap, IndexPaginate
 from common.src.helper import get_mapping, ignore_filelist
+from django.conf import settings
 from task.models import CustomPeriodicTask
 
 
 class ElasticBackup:
-    """dump index to nd-json files for later bulk import"""
+    """dump index to nd-json zip entries for later bulk import"""
 
     INDEX_SIZE_CONF = {
         "comment": 100,
@@ -26,6 +32,8 @@ class ElasticBackup:
     }
     CACHE_DIR = EnvironmentSettings.CACHE_DIR
     BACKUP_DIR = os.path.join(CACHE_DIR, "backup")
+    MANIFEST = "manifest.json"
+    DEFLATE_LEVEL = 1
 
     def __init__(self, reason=False, task=False) -> None:
         self.timestamp = datetime.now().strftime("%Y%m%d")
@@ -41,37 +49,106 @@ class ElasticBackup:
 
         if self.task:
             self.task.send_progress(["Scanning your index."])
-        for index in self.index_config:
-            index_name = index["index_name"]
-            print(f"backup: export in progress for {index_name}")
-            if not self.index_exists(index_name):
-                print(f"skip backup for not yet existing index {index_name}")
-                continue
 
-            self.backup_index(index_name)
+        file_name = f"ta_backup-{self.timestamp}-{self.reason}.zip"
+        backup_file = os.path.join(self.BACKUP_DIR, file_name)
+        tmp_file = f"{backup_file}.tmp"
+        codec, zip_kwargs = self._get_codec()
+        manifest = {
+            "version": settings.TA_VERSION,
+            "timestamp": self.timestamp,
+            "codec": codec,
+            "indexes": {},
+        }
+        try:
+            with zipfile.ZipFile(tmp_file, "w", **zip_kwargs) as zip_f:
+                for index in self.index_config:
+                    index_name = index["index_name"]
+                    print(f"backup: export in progress for {index_name}")
+                    if not self.index_exists(index_name):
+                        print(f"skip backup for not existing {index_name}")
+                        continue
+
+                    entry = self.backup_index(index_name, zip_f)
+                    manifest["indexes"][index_name] = entry
+
+                zip_f.writestr(self.MANIFEST, json.dumps(manifest, indent=2))
+
+            os.replace(tmp_file, backup_file)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
 
-        if self.task:
-            self.task.send_progress(["Compress files to zip archive."])
-        self.zip_it()
         if self.reason == "auto":
             self.rotate_backup()
 
-    def backup_index(self, index_name):
-        """export all documents of a single index"""
+    @classmethod
+    def _get_codec(cls) -> tuple[str, dict]:
+        """get zip compression from env, zstd if supported"""
+        codec = EnvironmentSettings.TA_BACKUP_CODEC
+        zstd = getattr(zipfile, "ZIP_ZSTANDARD", None)
+        if codec == "zstd" and zstd:
+            return codec, {"compression": zstd}
+
+        if codec != "deflate":
+            print(f"backup codec {codec} not supported, use deflate")
+
+        zip_kwargs = {
+            "compression": zipfile.ZIP_DEFLATED,
+            "compresslevel": cls.DEFLATE_LEVEL,
+        }
+
+        return "deflate", zip_kwargs
+
+    def backup_index(self, index_name, zip_f) -> dict:
+        """stream all documents of a single index into zip entry"""
         paginate_kwargs = {
             "data": {"query": {"match_all": {}}},
             "keep_source": True,
-            "callback": BackupCallback,
             "task": self.task,
             "total": self._get_total(index_name),
             "timeout": 30,
+            "slices": 4,
         }
 
         if size_overwrite := self.INDEX_SIZE_CONF.get(index_name):
             paginate_kwargs.update({"size": size_overwrite})
 
         paginate = IndexPaginate(f"ta_{index_name}", **paginate_kwargs)
-        _ = paginate.get_results()
+        file_name = f"es_{index_name}-{self.timestamp}.json"
+        checksum = hashlib.sha256()
+        docs = 0
+        with zip_f.open(file_name, "w", force_zip64=True) as f:
+            for all_hits in paginate.iter_pages():
+                content = self.build_bulk(all_hits).encode("utf-8")
+                f.write(content)
+                checksum.update(content)
+                docs += len(all_hits)
+
+        return {
+            "file": file_name,
+            "docs": docs,
+            "sha256": checksum.hexdigest(),
+        }
+
+    @staticmethod
+    def build_bulk(all_hits: list[dict]) -> str:
+        """build bulk query data from page of hits"""
+        bulk_list = []
+
+        for document in all_hits:
+            document_id = document["_id"]
+            es_index = re.sub(r"_v\d+$", "", document["_index"])  # remove _v
+            action = {"index": {"_index": es_index, "_id": document_id}}
+            source = document["_source"]
+            bulk_list.append(json.dumps(action))
+            bulk_list.append(json.dumps(source))
+
+        # add last newline
+        bulk_list.append("\n")
+        file_content = "\n".join(bulk_list)
+
+        return file_content
 
     @staticmethod
     def _get_total(index_name):
@@ -81,36 +158,6 @@ class ElasticBackup:
 
         return response.get("count")
 
-    def zip_it(self):
-        """pack it up into single zip file"""
-        file_name = f"ta_backup-{self.timestamp}-{self.reason}.zip"
-
-        to_backup = []
-        for file in os.listdir(self.BACKUP_DIR):
-            if file.endswith(".json"):
-                to_backup.append(os.path.join(self.BACKUP_DIR, file))
-
-        backup_file = os.path.join(self.BACKUP_DIR, file_name)
-
-        comp = zipfile.ZIP_DEFLATED
-        with zipfile.ZipFile(backup_file, "w", compression=comp) as zip_f:
-            for backup_file in to_backup:
-                zip_f.write(backup_file, os.path.basename(backup_file))
-
-        # cleanup
-        for backup_file in to_backup:
-            os.remove(backup_file)
-
-    def post_bulk_restore(self, file_name):
-        """send bulk to es"""
-        with open(file_name, "r", encoding="utf-8") as f:
-            data = f.read()
-
-        if not data.strip():
-            return
-
-        _, _ = ElasticWrap("_bulk").post(data=data, ndjson=True)
-
     def get_all_backup_files(self):
         """build all available backup files for view"""
         all_backup_files = ignore_filelist(os.listdir(self.BACKUP_DIR))
@@ -154,38 +201,95 @@ class ElasticBackup:
 
         return data
 
-    def restore(self, filename):
+    def validate(self, filename) -> None:
         """
-        restore from backup zip file
-        call reset from ElasticIndexWrap first to start blank
+        verify backup entries against manifest checksums and doc counts
+        call before reset, raise ValueError if backup is damaged
         """
-        zip_content = self._unpack_zip_backup(filename)
-        zip_content.sort()
-        self._restore_json_files(zip_content)
-
-    def _unpack_zip_backup(self, filename):
-        """extract backup zip and return filelist"""
         file_path = os.path.join(self.BACKUP_DIR, filename)
-
         with zipfile.ZipFile(file_path, "r") as z:
-            zip_content = z.namelist()
-            z.extractall(self.BACKUP_DIR)
+            if self.MANIFEST not in z.namelist():
+                print(f"{filename}: no manifest, skip validation")
+                return
 
-        return zip_content
+            manifest = json.loads(z.read(self.MANIFEST))
+            errors = []
+            for index_name, entry in manifest["indexes"].items():
+                print(f"validate backup of {index_name}")
+                if error := self._validate_entry(z, entry):
+                    errors.append(f"{index_name}: {error}")
 
-    def _restore_json_files(self, zip_content):
-        """go through the unpacked files and restore"""
-        for idx, json_f in enumerate(zip_content):
-            self._notify_restore(idx, json_f, len(zip_content))
-            file_name = os.path.join(self.BACKUP_DIR, json_f)
+        if errors:
+            message = ["Backup validation failed, index not reset:", *errors]
+            print(message)
+            if self.task:
+                self.task.send_progress(message, level="error")
 
-            if not json_f.startswith("es_") or not json_f.endswith(".json"):
-                os.remove(file_name)
-                continue
+            raise ValueError(" ".join(message))
 
-            print("restoring: " + json_f)
-            self.post_bulk_restore(file_name)
-            os.remove(file_name)
+    @staticmethod
+    def _validate_entry(z: zipfile.ZipFile, entry: dict) -> str | None:
+        """check single entry, return error or None if valid"""
+        if entry["file"] not in z.namelist():
+            return f"{entry['file']} missing"
+
+        checksum = hashlib.sha256()
+        lines = 0
+        try:
+            with z.open(entry["file"]) as f:
+                for line in f:
+                    checksum.update(line)
+                    if line.strip():
+                        lines += 1
+        except zipfile.BadZipFile as err:
+            return f"{entry['file']} corrupt: {err}"
+
+        if checksum.hexdigest() != entry["sha256"]:
+            return f"{entry['file']} checksum mismatch"
+
+        # action and source line per document
+        if lines // 2 != entry["docs"]:
+            return f"expected {entry['docs']} documents, found {lines // 2}"
+
+        return None
+
+    def restore(self, filename):
+        """
+        restore from backup zip file, streamed from the archive
+        call validate and reset from ElasticIndexWrap first to start blank
+        """
+        file_path = os.path.join(self.BACKUP_DIR, filename)
+        with zipfile.ZipFile(file_path, "r") as z:
+            to_restore = sorted(
+                i
+                for i in z.namelist()
+                if i.startswith("es_") and i.endswith(".json")
+            )
+            failed = {}
+            for idx, json_f in enumerate(to_restore):
+                self._notify_restore(idx, json_f, len(to_restore))
+                print("restoring: " + json_f)
+                index_name = json_f.removeprefix("es_").split("-")[0]
+                with z.open(json_f) as f:
+                    lines = io.TextIOWrapper(f, encoding="utf-8")
+                    restore = BulkRestore(f"ta_{index_name}")
+                    if index_failed := restore.run(lines):
+                        failed[index_name] = len(index_failed)
+
+        if failed:
+            self._notify_restore_failed(failed)
+
+    def _notify_restore_failed(self, failed: dict[str, int]) -> None:
+        """report failed documents per index, raise to fail task"""
+        message = [
+            "Restore incomplete, documents failed to restore:",
+            ", ".join(f"{key}: {value}" for key, value in failed.items()),
+        ]
+        print(message)
+        if self.task:
+            self.task.send_progress(message, level="error")
+
+        raise ValueError(" ".join(message))
 
     def _notify_restore(self, idx, json_f, total_files):
         """notify restore progress"""
@@ -236,43 +340,150 @@ class ElasticBackup:
         return file_path
 
 
-class BackupCallback:
-    """handle backup ndjson writer as callback for IndexPaginate"""
+class BulkRestore:
+    """stream nd-json bulk lines into index in size bounded chunks
+    refresh and replicas are disabled on the target index while loading
+    """
 
-    def __init__(self, source, index_name, counter=0):
-        self.source = source
+    CHUNK_BYTES = 5 * 1024 * 1024
+    WORKERS = 3
+    MAX_RETRIES = 6
+    BACKOFF = 2
+    SOURCE_ACTIONS = {"index", "create", "update"}
+
+    def __init__(self, index_name: str) -> None:
         self.index_name = index_name
-        self.counter = counter
-        self.timestamp = datetime.now().strftime("%Y%m%d")
-        self.cache_dir = EnvironmentSettings.CACHE_DIR
+        self.in_flight = threading.BoundedSemaphore(self.WORKERS * 2)
+        self.failed: list[dict] = []
+        self._lock = threading.Lock()
 
-    def run(self):
-        """run the junk task"""
-        file_content = self._build_bulk()
-        self._write_es_json(file_content)
+    def run(self, lines) -> list[dict]:
+        """load all lines, return failed items"""
+        settings_before = self._disable_refresh()
+        try:
+            with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+                for chunk in self.iter_chunks(lines):
+                    self.in_flight.acquire()
+                    future = executor.submit(self._send_chunk, chunk)
+                    future.add_done_callback(
+                        lambda f, chunk=chunk: self._release(f, chunk)
+                    )
+        finally:
+            self._reset_refresh(settings_before)
+
+        if self.failed:
+            print(f"{self.index_name}: {len(self.failed)} failed to restore")
+
+        return self.failed
+
+    def iter_chunks(self, lines):
+        """yield lists of (action, source) pairs up to CHUNK_BYTES"""
+        chunk: list[tuple[str, str | None]] = []
+        chunk_size = 0
+        lines = (i.strip() for i in lines)
+        for line in lines:
+            if not line:
+                continue
 
-    def _build_bulk(self):
-        """build bulk query data from all_results"""
-        bulk_list = []
+            source = None
+            if self.SOURCE_ACTIONS.intersection(json.loads(line)):
+                source = next((i for i in lines if i), None)
+
+            chunk.append((line, source))
+            chunk_size += len(line) + len(source or "") + 2
+            if chunk_size >= self.CHUNK_BYTES:
+                yield chunk
+                chunk = []
+                chunk_size = 0
+
+        if chunk:
+            yield chunk
+
+    def _release(self, future, chunk) -> None:
+        """free in flight slot, collect chunk of failed worker"""
+        self.in_flight.release()
+        if err := future.exception():
+            print(f"{self.index_name}: bulk restore failed: {err}")
+            self._add_failed(chunk, {"error": str(err)})
+
+    def _add_failed(self, chunk, error: dict) -> None:
+        """collect all pairs of chunk as failed"""
+        with self._lock:
+            self.failed.extend({"action": i[0], **error} for i in chunk)
+
+    def _send_chunk(self, chunk) -> None:
+        """post chunk, retry rejected items with exponential backoff"""
+        for attempt in range(self.MAX_RETRIES + 1):
+            if attempt:
+                sleep(self.BACKOFF**attempt)
+
+            response, status_code = ElasticWrap("_bulk").post(
+                data=self._build_body(chunk), ndjson=True
+            )
+            if status_code == 429:
+                continue
 
-        for document in self.source:
-            document_id = document["_id"]
-            es_index = re.sub(r"_v\d+$", "", document["_index"])  # remove _v
-            action = {"index": {"_index": es_index, "_id": document_id}}
-            source = document["_source"]
-            bulk_list.append(json.dumps(action))
-            bulk_list.append(json.dumps(source))
+            if status_code not in [200, 201]:
+                error = {"status": status_code, "error": response}
+                self._add_failed(chunk, error)
+                return
 
-        # add last newline
-        bulk_list.append("\n")
-        file_content = "\n".join(bulk_list)
+            chunk = self._get_rejected(chunk, response)
+            if not chunk:
+                return
 
-        return file_content
+        self._add_failed(chunk, {"status": 429})
+
+    @staticmethod
+    def _build_body(chunk) -> str:
+        """build nd-json request body from pairs"""
+        lines = []
+        for action, source in chunk:
+            lines.append(action)
+            if source is not None:
+                lines.append(source)
+
+        return "\n".join(lines) + "\n"
+
+    def _get_rejected(self, chunk, response) -> list:
+        """return pairs rejected with 429, collect other failures"""
+        if not response.get("errors"):
+            return []
+
+        rejected = []
+        for pair, item in zip(chunk, response["items"]):
+            result = next(iter(item.values()))
+            status = result.get("status", 200)
+            if status == 429:
+                rejected.append(pair)
+            elif status >= 300:
+                with self._lock:
+                    self.failed.append(result)
+
+        return rejected
+
+    def _disable_refresh(self) -> dict:
+        """disable refresh and replicas, return previous settings"""
+        path = f"{self.index_name}/_settings"
+        response, status_code = ElasticWrap(path).get()
+        if status_code != 200:
+            return {}
+
+        index_settings = next(iter(response.values()))["settings"]["index"]
+        settings_before = {
+            "refresh_interval": index_settings.get("refresh_interval"),
+            "number_of_replicas": index_settings.get("number_of_replicas"),
+        }
+        data = {"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+        ElasticWrap(path).put(data)
+
+        return settings_before
+
+    def _reset_refresh(self, settings_before: dict) -> None:
+        """restore previous index settings and refresh"""
+        if not settings_before:
+            return
 
-    def _write_es_json(self, file_content):
-        """write nd-json file for es _bulk API to disk"""
-        index = self.index_name.lstrip("ta_")
-        file_name = f"es_{index}-{self.timestamp}-{self.counter}.json"
-        file_path = os.path.join(self.cache_dir, "backup", file_name)
-        with open(file_path, "a+", encoding="utf-8") as f:
-            f.write(file_content)
+        path = f"{self.index_name}/_settings"
+        ElasticWrap(path).put({"index": settings_before})
+        ElasticWrap(f"{self.index_name}/_refresh").post()
@@ -43,6 +43,8 @@ class DownloadsConfigType(TypedDict):
     cookie_import: bool
     pot_provider_url: str | None
     throttledratelimit: int | None
+    parallel_downloads: int | None
+    requests_per_minute: int | None
     extractor_lang: str | None
     integrate_ryd: bool
     integrate_sponsorblock: bool
@@ -92,6 +94,8 @@ class AppConfig:
             "cookie_import": False,
             "pot_provider_url": None,
             "throttledratelimit": None,
+            "parallel_downloads": None,
+            "requests_per_minute": None,
             "extractor_lang": None,
             "integrate_ryd": False,
             "integrate_sponsorblock": False,
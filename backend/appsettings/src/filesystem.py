@@ -1,13 +1,18 @@
 """
 Functionality:
 - scan the filesystem to delete or index
+- persist file manifest to only rescan changed channel folders
+- index from embedded metadata concurrently in bulk
 """
 
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 
 from appsettings.src.config import AppConfig
 from common.src.env_settings import EnvironmentSettings
-from common.src.es_connect import IndexPaginate
+from common.src.es_connect import ElasticBulk, IndexPaginate
 from common.src.helper import ignore_filelist, rand_sleep
 from video.src.comments import Comments
 from video.src.index import YoutubeVideo, index_new_video
@@ -18,6 +23,7 @@ class Scanner:
     """scan index and filesystem"""
 
     VIDEOS: str = EnvironmentSettings.MEDIA_DIR
+    EMBED_WORKERS: int = 4
 
     def __init__(
         self,
@@ -40,36 +46,33 @@ class Scanner:
         self.to_delete = indexed - downloaded
 
     def _get_downloaded(self) -> set[tuple[str, str]]:
-        """get downloaded ids"""
+        """get downloaded ids, unchanged folders from manifest"""
         if self.task:
             self.task.send_progress(["Scan your filesystem for videos."])
 
-        downloaded: set = set()
-        channels = ignore_filelist(os.listdir(self.VIDEOS))
-        for channel in channels:
-            folder = os.path.join(self.VIDEOS, channel)
-            files = ignore_filelist(os.listdir(folder))
-            downloaded.update(
-                {
-                    (i.split(".")[0], f"{channel}/{i}")
-                    for i in files
-                    if i.endswith(".mp4")
-                }
-            )
+        manifest = FileManifest(self.VIDEOS)
+        downloaded = manifest.scan()
+        print(
+            f"[scanner] {len(downloaded)} videos on filesystem, "
+            + f"rescanned {manifest.rescanned} channel folders"
+        )
 
         return downloaded
 
     def _get_indexed(self) -> set[tuple[str, str]]:
-        """get all indexed ids"""
+        """get all indexed ids, streamed from docvalues"""
         if self.task:
             self.task.send_progress(["Get all videos indexed."])
 
-        data = {
-            "query": {"match_all": {}},
-            "_source": ["youtube_id", "media_url"],
+        paginate = IndexPaginate(
+            "ta_video",
+            data={"query": {"match_all": {}}},
+            docvalue_fields=["youtube_id", "media_url"],
+            slices=4,
+        )
+        return {
+            (i["youtube_id"], i["media_url"]) for i in paginate.iter_hits()
         }
-        response = IndexPaginate("ta_video", data).get_results()
-        return {(i["youtube_id"], i["media_url"]) for i in response}
 
     def apply(self) -> None:
         """apply all changes"""
@@ -94,44 +97,78 @@ class Scanner:
             YoutubeVideo(youtube_id).delete_media_file()
 
     def index(self) -> None:
-        """index new"""
+        """index new, local from embed first if prefer_local"""
         if not self.to_index:
             print("[scanner] nothing to index")
             return
 
-        total = len(self.to_index)
-        for idx, (youtube_id, media_url) in enumerate(self.to_index):
+        to_remote = sorted(self.to_index)
+        if self.prefer_local:
+            to_remote = self._index_local(to_remote)
+
+        total = len(to_remote)
+        for idx, (youtube_id, media_url) in enumerate(to_remote):
             self._notify(total, youtube_id, idx)
+            self._index_remote(youtube_id, media_url)
 
-            file_path = os.path.join(self.VIDEOS, media_url)
-            if self.prefer_local:
-                # try index from embed
-                json_data = IndexFromEmbed(
-                    file_path, use_user_conf=True, config=self.config
-                ).run_index()
-                if json_data:
-                    continue
+    def _index_local(
+        self, to_index: list[tuple[str, str]]
+    ) -> list[tuple[str, str]]:
+        """index from embedded metadata concurrently, return not indexed"""
+        not_indexed = []
+        total = len(to_index)
+        with ElasticBulk(max_actions=100, refresh=True) as bulk:
+            with ThreadPoolExecutor(max_workers=self.EMBED_WORKERS) as pool:
+                results = pool.map(
+                    lambda item: self._index_embed(item[1], bulk), to_index
+                )
+                for idx, (item, json_data) in enumerate(
+                    zip(to_index, results)
+                ):
+                    self._notify(total, item[0], idx)
+                    if not json_data:
+                        not_indexed.append(item)
 
-            try:
-                # try index from remote
-                json_data = index_new_video(youtube_id)
-                Comments(youtube_id).build_json(upload=True)
-                YoutubeVideo(youtube_id).embed_metadata()
-                rand_sleep(self.config)
-            except ValueError as err:
+        if bulk.failed:
+            print(f"[scanner] {len(bulk.failed)} failed to index from embed")
+
+        return not_indexed
+
+    def _index_embed(self, media_url: str, bulk: ElasticBulk) -> dict | None:
+        """index single file from embed, None if not possible"""
+        file_path = os.path.join(self.VIDEOS, media_url)
+        try:
+            return IndexFromEmbed(
+                file_path, use_user_conf=True, config=self.config, bulk=bulk
+            ).run_index()
+        except ValueError as err:
+            print(f"[scanner] {media_url}: index from embed failed: {err}")
+            return None
+
+    def _index_remote(self, youtube_id: str, media_url: str) -> None:
+        """index single video from remote, fallback to embed"""
+        file_path = os.path.join(self.VIDEOS, media_url)
+        try:
+            # try index from remote
+            index_new_video(youtube_id)
+            Comments(youtube_id).build_json(upload=True)
+            YoutubeVideo(youtube_id).embed_metadata()
+            rand_sleep(self.config)
+        except ValueError as err:
+            if not self.prefer_local:
                 # fallback from index from embed
                 json_data = IndexFromEmbed(
                     file_path, use_user_conf=True, config=self.config
                 ).run_index()
                 if json_data:
-                    continue
+                    return
 
-                if self.ignore_error:
-                    self._notify_error(youtube_id)
-                    rand_sleep(self.config)
-                    continue
+            if self.ignore_error:
+                self._notify_error(youtube_id)
+                rand_sleep(self.config)
+                return
 
-                raise ValueError from err
+            raise ValueError from err
 
     def _notify(self, total, youtube_id, idx):
         """send notification"""
@@ -156,3 +193,97 @@ class Scanner:
             message_lines=[message, "Continue..."],
             level="error",
         )
+
+
+class FileManifest:
+    """persisted snapshot of the media folder
+    channel folders with unchanged mtime are read from the manifest,
+    changed folders are rescanned for size, mtime and youtube_id per file
+    """
+
+    MANIFEST_PATH: str = os.path.join(
+        EnvironmentSettings.CACHE_DIR, "filesystem_manifest.json"
+    )
+    VERSION: int = 1
+    RACY_SECS: int = 2
+
+    def __init__(self, media_dir: str) -> None:
+        self.media_dir = media_dir
+        self.channels: dict[str, dict] = self._load()
+        self.rescanned: int = 0
+
+    def _load(self) -> dict[str, dict]:
+        """load channels from manifest if valid"""
+        try:
+            with open(self.MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        if manifest.get("version") != self.VERSION:
+            return {}
+
+        if manifest.get("media_dir") != self.media_dir:
+            return {}
+
+        return manifest.get("channels", {})
+
+    def scan(self) -> set[tuple[str, str]]:
+        """scan media folder, return set of youtube_id, media_url"""
+        scan_start = time()
+        channels = {}
+        with os.scandir(self.media_dir) as it:
+            for entry in it:
+                if not entry.is_dir() or not ignore_filelist([entry.name]):
+                    continue
+
+                channels[entry.name] = self._scan_channel(entry, scan_start)
+
+        self.channels = channels
+        self.save()
+
+        return {
+            (youtube_id, f"{channel}/{file_name}")
+            for channel, folder in channels.items()
+            for file_name, (_, _, youtube_id) in folder["files"].items()
+        }
+
+    def _scan_channel(self, entry: os.DirEntry, scan_start: float) -> dict:
+        """get channel folder from manifest or rescan if changed"""
+        mtime: float | None = entry.stat().st_mtime
+        cached = self.channels.get(entry.name)
+        if cached and cached["mtime"] == mtime:
+            return cached
+
+        self.rescanned += 1
+        files = {}
+        with os.scandir(entry.path) as it:
+            for file in it:
+                if not file.name.endswith(".mp4"):
+                    continue
+
+                if not ignore_filelist([file.name]):
+                    continue
+
+                stat = file.stat()
+                youtube_id = file.name.split(".")[0]
+                files[file.name] = [stat.st_size, stat.st_mtime, youtube_id]
+
+        if mtime >= scan_start - self.RACY_SECS:
+            # changes within mtime resolution could go unnoticed
+            mtime = None
+
+        return {"mtime": mtime, "files": files}
+
+    def save(self) -> None:
+        """write manifest to cache dir"""
+        manifest = {
+            "version": self.VERSION,
+            "media_dir": self.media_dir,
+            "channels": self.channels,
+        }
+        tmp_file = f"{self.MANIFEST_PATH}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        os.replace(tmp_file, self.MANIFEST_PATH)
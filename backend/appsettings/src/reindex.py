@@ -6,22 +6,28 @@ functionality:
 
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
+from time import monotonic
 from typing import TypedDict
 
 from appsettings.src.config import AppConfig
 from channel.src.index import YoutubeChannel
 from channel.src.remote_query import get_last_channel_videos
 from common.src.env_settings import EnvironmentSettings
-from common.src.es_connect import ElasticWrap, IndexPaginate
+from common.src.es_connect import ElasticBulk, ElasticWrap, IndexPaginate
 from common.src.helper import rand_sleep
+from common.src.rate_limit import RateLimiter
 from common.src.ta_redis import RedisQueue
 from download.src.thumbnails import ThumbManager
-from download.src.yt_dlp_base import CookieHandler
+from download.src.yt_dlp_base import CookieHandler, YtWrap
 from playlist.src.index import YoutubePlaylist
 from task.models import CustomPeriodicTask
 from video.src.comments import Comments
 from video.src.index import YoutubeVideo
+from video.src.subtitle import YoutubeSubtitle
 
 
 class ReindexConfigType(TypedDict):
@@ -100,16 +106,15 @@ class ReindexPopulate(ReindexBase):
             {"range": {"published": {"gte": gte}}},
         ]
         data = {
-            "size": 10000,
             "query": {"bool": {"must": must_list}},
             "sort": [{"published": {"order": "desc"}}],
+            "_source": False,
         }
-        response, _ = ElasticWrap("ta_video/_search").get(data=data)
-        hits = response["hits"]["hits"]
-        if not hits:
+        paginate = IndexPaginate("ta_video", data, keep_source=True)
+        all_ids = [i["_id"] for i in paginate.iter_hits()]
+        if not all_ids:
             return
 
-        all_ids = [i["_source"]["youtube_id"] for i in hits]
         reindex_config: ReindexConfigType = self.REINDEX_CONFIG["video"]
         self.populate(all_ids, reindex_config)
 
@@ -123,29 +128,22 @@ class ReindexPopulate(ReindexBase):
 
     @staticmethod
     def _get_total_hits(reindex_config: ReindexConfigType) -> int:
-        """get total hits from index"""
+        """get total active documents from index"""
         index_name = reindex_config["index_name"]
         active_key = reindex_config["active_key"]
-        data = {
-            "query": {"term": {active_key: {"value": True}}},
-            "_source": False,
-        }
-        total = IndexPaginate(index_name, data, keep_source=True).get_results()
+        data = {"query": {"term": {active_key: {"value": True}}}}
+        response, _ = ElasticWrap(f"{index_name}/_count").get(data=data)
 
-        return len(total)
+        return response.get("count", 0)
 
     def _get_daily_should(self, total_hits: int) -> int:
         """calc how many should reindex daily"""
-        daily_should = int((total_hits // self.interval + 1) * self.MULTIPLY)
-        if daily_should >= 10000:
-            daily_should = 9999
-
-        return daily_should
+        return int((total_hits // self.interval + 1) * self.MULTIPLY)
 
     def _get_outdated_ids(
         self, reindex_config: ReindexConfigType, daily_should: int
     ) -> list[str]:
-        """get outdated from index_name"""
+        """get oldest outdated ids from index_name, up to daily_should"""
         index_name = reindex_config["index_name"]
         refresh_key = reindex_config["refresh_key"]
         now_lte = str(self.now - self.interval * 24 * 60 * 60)
@@ -154,14 +152,19 @@ class ReindexPopulate(ReindexBase):
             {"range": {refresh_key: {"lte": now_lte}}},
         ]
         data = {
-            "size": daily_should,
             "query": {"bool": {"must": must_list}},
             "sort": [{refresh_key: {"order": "asc"}}],
             "_source": False,
         }
-        response, _ = ElasticWrap(f"{index_name}/_search").get(data=data)
+        paginate = IndexPaginate(
+            index_name,
+            data,
+            keep_source=True,
+            size=min(daily_should, IndexPaginate.DEFAULT_SIZE),
+        )
+        hits = islice(paginate.iter_hits(), daily_should)
+        all_ids = [i["_id"] for i in hits]
 
-        all_ids = [i["_id"] for i in response["hits"]["hits"]]
         return all_ids
 
 
@@ -236,23 +239,32 @@ class ReindexManual(ReindexBase):
         """get all videos from channel"""
         data = {
             "query": {"term": {"channel.channel_id": {"value": channel_id}}},
-            "_source": ["youtube_id"],
         }
-        all_results = IndexPaginate("ta_video", data).get_results()
-        return [i["youtube_id"] for i in all_results]
+        paginate = IndexPaginate(
+            "ta_video", data, docvalue_fields=["youtube_id"]
+        )
+        return [i["youtube_id"] for i in paginate.iter_hits()]
 
     def _get_playlist_videos(self, playlist_id: str) -> list[str]:
         """get all videos from playlist"""
         data = {
             "query": {"term": {"playlist.keyword": {"value": playlist_id}}},
-            "_source": ["youtube_id"],
         }
-        all_results = IndexPaginate("ta_video", data).get_results()
-        return [i["youtube_id"] for i in all_results]
+        paginate = IndexPaginate(
+            "ta_video", data, docvalue_fields=["youtube_id"]
+        )
+        return [i["youtube_id"] for i in paginate.iter_hits()]
 
 
 class Reindex(ReindexBase):
-    """reindex all documents from redis queue"""
+    """reindex all documents from redis queue
+    parallel workers claim ids from the shared queue, connection errors
+    back off all workers, abort after MAX_BACKOFF escalations in a row
+    """
+
+    MAX_WORKERS = 8
+    BACKOFF_SECS = 60
+    MAX_BACKOFF = 3
 
     def __init__(self, task=False):
         super().__init__()
@@ -262,6 +274,20 @@ class Reindex(ReindexBase):
             "channels": 0,
             "playlists": 0,
         }
+        self.workers = self._get_workers()
+        self.limiter = RateLimiter.for_host(
+            YtWrap.RATE_LIMIT_HOST,
+            self.config["downloads"].get("requests_per_minute"),
+        )
+        self.failures: int = 0
+        self.last_backoff: float = 0
+        self.subtitle_bulk: ElasticBulk | None = None
+        self._lock = threading.Lock()
+
+    def _get_workers(self) -> int:
+        """get number of parallel workers, shared with downloads"""
+        workers = self.config["downloads"].get("parallel_downloads") or 1
+        return max(1, min(workers, self.MAX_WORKERS))
 
     def reindex_all(self) -> None:
         """reindex all in queue"""
@@ -269,16 +295,57 @@ class Reindex(ReindexBase):
             print("[reindex] cookie invalid, exiting...")
             return
 
-        for name, index_config in self.REINDEX_CONFIG.items():
-            if not RedisQueue(index_config["queue_name"]).length():
-                continue
+        self.subtitle_bulk = YoutubeSubtitle.new_bulk()
+        try:
+            for name, index_config in self.REINDEX_CONFIG.items():
+                if not RedisQueue(index_config["queue_name"]).length():
+                    continue
 
-            self.reindex_type(name, index_config)
+                self.reindex_type(name, index_config)
+        finally:
+            self.subtitle_bulk.flush()
+            self.subtitle_bulk = None
 
     def reindex_type(self, name: str, index_config: ReindexConfigType) -> None:
         """reindex all of a single index"""
+        abort = threading.Event()
+        if self.workers == 1:
+            self._run_loop(name, index_config, abort)
+            return
+
+        print(f"[reindex] start {self.workers} parallel {name} workers")
+        request = self.task.request if self.task else None
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(
+                    self._run_slot, name, index_config, abort, request
+                )
+                for _ in range(self.workers)
+            ]
+
+        # raises first failed worker
+        for future in futures:
+            future.result()
+
+    def _run_slot(self, name, index_config, abort, request) -> None:
+        """run loop in worker thread, abort other workers on error"""
+        if request:
+            # task request context is thread local
+            self.task.request_stack.push(request)
+
+        try:
+            self._run_loop(name, index_config, abort)
+        except Exception:
+            abort.set()
+            raise
+        finally:
+            if request:
+                self.task.request_stack.pop()
+
+    def _run_loop(self, name, index_config, abort) -> None:
+        """claim ids from queue until empty or aborted"""
         queue = RedisQueue(index_config["queue_name"])
-        while True:
+        while not abort.is_set():
             total = queue.max_score()
             youtube_id, idx = queue.get_next()
             if not youtube_id or not idx or not total:
@@ -287,19 +354,54 @@ class Reindex(ReindexBase):
             if self.task:
                 self._notify(name, total, idx)
 
-            index_name = index_config["index_name"]
-            if index_name == "ta_video":
-                video = self.reindex_single_video(youtube_id)
-                if video:
-                    self._reindex_video_related(video)
+            self.limiter.wait()
+            started = monotonic()
+            try:
+                self._reindex_single(index_config["index_name"], youtube_id)
+            except ConnectionError:
+                queue.put_back(youtube_id, idx)
+                self._backoff(started)
+                continue
 
-            elif index_name == "ta_channel":
-                self._reindex_single_channel(channel_id=youtube_id)
-            elif index_name == "ta_playlist":
-                self._reindex_single_playlist(playlist_id=youtube_id)
+            with self._lock:
+                self.failures = 0
 
             rand_sleep(self.config)
 
+    def _reindex_single(self, index_name: str, youtube_id: str) -> None:
+        """reindex single document of index_name"""
+        if index_name == "ta_video":
+            video = self.reindex_single_video(youtube_id)
+            if video:
+                self._reindex_video_related(video)
+
+        elif index_name == "ta_channel":
+            self._reindex_single_channel(channel_id=youtube_id)
+        elif index_name == "ta_playlist":
+            self._reindex_single_playlist(playlist_id=youtube_id)
+
+    def _backoff(self, started: float) -> None:
+        """back off all workers, escalate only once for parallel failures"""
+        with self._lock:
+            if started < self.last_backoff:
+                # was in flight before last backoff
+                return
+
+            self.failures += 1
+            if self.failures > self.MAX_BACKOFF:
+                raise ConnectionError("[reindex] failed repeatedly, abort!")
+
+            secs = self.BACKOFF_SECS * 2 ** (self.failures - 1)
+            self.last_backoff = monotonic()
+
+        print(f"[reindex] connection error, back off for {secs}s")
+        self.limiter.backoff(secs)
+
+    def _add_processed(self, key: str) -> None:
+        """count processed document, threadsafe"""
+        with self._lock:
+            self.processed[key] += 1
+
     def _notify(self, name: str, total: int, idx: int) -> None:
         """send notification back to task"""
         message = [f"Reindexing {name.title()}s {idx}/{total}"]
@@ -333,8 +435,10 @@ class Reindex(ReindexBase):
             video.deactivate()
             return None
 
-        video.delete_subtitles(subtitles=es_meta.get("subtitles"))
-        video.check_subtitles()
+        video.delete_subtitles(
+            subtitles=es_meta.get("subtitles"), bulk=self.subtitle_bulk
+        )
+        video.check_subtitles(bulk=self.subtitle_bulk)
 
         # add back
         video.json_data["player"] = es_meta.get("player")
@@ -345,7 +449,11 @@ class Reindex(ReindexBase):
             video.json_data["playlist"] = es_meta.get("playlist")
 
         video.upload_to_es()
-        self.processed["videos"] += 1
+        if self.subtitle_bulk:
+            # video lists subtitles as indexed, write fragments now
+            self.subtitle_bulk.flush()
+
+        self._add_processed("videos")
 
         return video
 
@@ -389,7 +497,7 @@ class Reindex(ReindexBase):
         channel.upload_to_es()
         channel.sync_to_videos()
         ChannelFullScan(channel_id, self.config).scan()
-        self.processed["channels"] += 1
+        self._add_processed("channels")
 
     def _reindex_single_playlist(self, playlist_id: str) -> None:
         """refresh playlist data"""
@@ -406,7 +514,7 @@ class Reindex(ReindexBase):
             playlist.deactivate()
             return
 
-        self.processed["playlists"] += 1
+        self._add_processed("playlists")
 
     def cookie_is_valid(self) -> bool:
         """return true if cookie is enabled and valid"""
@@ -56,6 +56,8 @@ class EnvironmentSettings:
     TA_BACKEND_PORT: int = int(environ.get("TA_BACKEND_PORT", False))
     TA_USERNAME: str = str(environ.get("TA_USERNAME"))
     TA_PASSWORD: str = get_password_from_file("TA_PASSWORD")
+    TA_BACKUP_CODEC: str = str(environ.get("TA_BACKUP_CODEC", "deflate"))
+    PROGRESS_RATE: float = float(environ.get("TA_PROGRESS_RATE", 2))
 
     # Application Paths
     MEDIA_DIR: str = str(environ.get("TA_MEDIA_DIR", "/youtube"))
@@ -76,6 +78,9 @@ class EnvironmentSettings:
         )
     )
     ES_DISABLE_VERIFY_SSL: bool = bool(environ.get("ES_DISABLE_VERIFY_SSL"))
+    ES_POOL_SIZE: int = int(environ.get("ES_POOL_SIZE", 10))
+    ES_MAX_RETRIES: int = int(environ.get("ES_MAX_RETRIES", 3))
+    ES_DISABLE_COMPRESSION: bool = bool(environ.get("ES_DISABLE_COMPRESSION"))
 
     def get_cache_root(self):
         """get root for web server"""
@@ -101,7 +106,9 @@ class EnvironmentSettings:
             TA_PORT: {self.TA_PORT}
             TA_BACKEND_PORT: {self.TA_BACKEND_PORT}
             TA_USERNAME: {self.TA_USERNAME}
-            TA_PASSWORD: *****""")
+            TA_PASSWORD: *****
+            TA_BACKUP_CODEC: {self.TA_BACKUP_CODEC}
+            TA_PROGRESS_RATE: {self.PROGRESS_RATE}""")
 
     def print_paths(self):
         """debug paths set"""
@@ -123,7 +130,10 @@ class EnvironmentSettings:
             ES_PASS: *****
             ES_USER: {self.ES_USER}
             ES_SNAPSHOT_DIR: {self.ES_SNAPSHOT_DIR}
-            ES_DISABLE_VERIFY_SSL: {self.ES_DISABLE_VERIFY_SSL}""")
+            ES_DISABLE_VERIFY_SSL: {self.ES_DISABLE_VERIFY_SSL}
+            ES_POOL_SIZE: {self.ES_POOL_SIZE}
+            ES_MAX_RETRIES: {self.ES_MAX_RETRIES}
+            ES_DISABLE_COMPRESSION: {self.ES_DISABLE_COMPRESSION}""")
 
     def print_all(self):
         """print all"""
@@ -1,17 +1,157 @@
 """
 functionality:
 - wrapper around requests to call elastic search
+- pooled keep-alive session per process
+- buffered _bulk writer
 - reusable search_after to extract total index
 """
 
 # pylint: disable=missing-timeout
 
+import gzip
 import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from time import monotonic, sleep
 from typing import Any
 
 import requests
 import urllib3
 from common.src.env_settings import EnvironmentSettings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+
+class ElasticRetry(Retry):
+    """retry rejected requests, POST only to read only endpoints
+    writes like _bulk or _update_by_query can be partially applied
+    before rejection and are not replayed
+    """
+
+    READ_ONLY: set[str] = {"_search", "_count", "_mget", "_msearch"}
+
+    def increment(
+        self,
+        method=None,
+        url=None,
+        response=None,
+        error=None,
+        _pool=None,
+        _stacktrace=None,
+    ):
+        """stop on rejected write, return response as is"""
+        if response is not None and method == "POST":
+            endpoint = (url or "").split("?")[0].rstrip("/").split("/")[-1]
+            if endpoint not in self.READ_ONLY:
+                raise MaxRetryError(_pool, url, "write request rejected")
+
+        return super().increment(
+            method, url, response, error, _pool, _stacktrace
+        )
+
+
+class ElasticSession:
+    """shared keep-alive session to ES, one connection pool per process
+    rebuilt after fork, so prefork celery and gunicorn workers never share
+    sockets with their parent
+    """
+
+    RETRY_STATUS: list[int] = [429, 503]
+    BACKOFF_FACTOR: float = 0.5
+    COMPRESS_MIN_BYTES: int = 4096
+
+    _session: requests.Session | None = None
+    _pid: int | None = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """get session of current process, build on first call"""
+        pid = os.getpid()
+        if cls._session is not None and cls._pid == pid:
+            return cls._session
+
+        with cls._lock:
+            if cls._session is None or cls._pid != pid:
+                cls._session = cls._build_session()
+                cls._pid = pid
+
+        return cls._session
+
+    @classmethod
+    def _build_session(cls) -> requests.Session:
+        """build session with pooled adapter and retry on rejection"""
+        retries = EnvironmentSettings.ES_MAX_RETRIES
+        retry = ElasticRetry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            other=0,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+            status_forcelist=cls.RETRY_STATUS,
+            backoff_factor=cls.BACKOFF_FACTOR,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=EnvironmentSettings.ES_POOL_SIZE,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.auth = (
+            EnvironmentSettings.ES_USER,
+            EnvironmentSettings.ES_PASS,
+        )
+        session.headers.update({"Accept-Encoding": "gzip"})
+        if EnvironmentSettings.ES_DISABLE_VERIFY_SSL:
+            session.verify = False
+
+        return session
+
+    @classmethod
+    def encode_body(cls, body: str | bytes) -> tuple[bytes, dict]:
+        """encode request body, gzip if above threshold"""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        if (
+            EnvironmentSettings.ES_DISABLE_COMPRESSION
+            or len(body) < cls.COMPRESS_MIN_BYTES
+        ):
+            return body, {}
+
+        return gzip.compress(body, compresslevel=1), {
+            "Content-Encoding": "gzip"
+        }
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        """connection reuse counters of current process"""
+        counters = {"requests": 0, "connections": 0, "reused": 0}
+        if cls._session is None or cls._pid != os.getpid():
+            return counters
+
+        adapter = cls._session.get_adapter(EnvironmentSettings.ES_URL)
+        pools = adapter.poolmanager.pools  # type: ignore
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if not pool:
+                continue
+
+            counters["requests"] += pool.num_requests
+            counters["connections"] += pool.num_connections
+
+        counters["reused"] = counters["requests"] - counters["connections"]
+
+        return counters
 
 
 class ElasticWrap:
@@ -21,14 +161,28 @@ class ElasticWrap:
 
     def __init__(self, path: str):
         self.url: str = f"{EnvironmentSettings.ES_URL}/{path}"
-        self.auth: tuple[str, str] = (
-            EnvironmentSettings.ES_USER,
-            EnvironmentSettings.ES_PASS,
-        )
+        self.session: requests.Session = ElasticSession.get_session()
 
         if EnvironmentSettings.ES_DISABLE_VERIFY_SSL:
             urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+    @staticmethod
+    def _build_body(
+        data: bool | dict | str, ndjson: bool = False
+    ) -> dict[str, Any]:
+        """build request kwargs for body"""
+        if ndjson:
+            content_type = "application/x-ndjson"
+            to_send = data
+        else:
+            content_type = "application/json"
+            to_send = json.dumps(data)
+
+        body, headers = ElasticSession.encode_body(to_send)  # type: ignore
+        headers["Content-type"] = content_type
+
+        return {"data": body, "headers": headers}
+
     def get(
         self,
         data: bool | dict = False,
@@ -37,18 +191,11 @@ class ElasticWrap:
     ) -> tuple[dict, int]:
         """get data from es"""
 
-        kwargs: dict[str, Any] = {
-            "auth": self.auth,
-            "timeout": timeout,
-        }
-
-        if EnvironmentSettings.ES_DISABLE_VERIFY_SSL:
-            kwargs["verify"] = False
-
+        kwargs: dict[str, Any] = {"timeout": timeout}
         if data:
-            kwargs["json"] = data
+            kwargs.update(self._build_body(data))
 
-        response = requests.get(self.url, **kwargs)
+        response = self.session.get(self.url, **kwargs)
 
         if print_error and not response.ok:
             print(response.text)
@@ -60,27 +207,11 @@ class ElasticWrap:
     ) -> tuple[dict, int]:
         """post data to es"""
 
-        kwargs: dict[str, Any] = {"auth": self.auth}
-
-        if ndjson and data:
-            kwargs.update(
-                {
-                    "headers": {"Content-type": "application/x-ndjson"},
-                    "data": data,
-                }
-            )
-        elif data:
-            kwargs.update(
-                {
-                    "headers": {"Content-type": "application/json"},
-                    "data": json.dumps(data),
-                }
-            )
-
-        if EnvironmentSettings.ES_DISABLE_VERIFY_SSL:
-            kwargs["verify"] = False
+        kwargs: dict[str, Any] = {}
+        if data:
+            kwargs.update(self._build_body(data, ndjson=ndjson))
 
-        response = requests.post(self.url, **kwargs)
+        response = self.session.post(self.url, **kwargs)
 
         if not response.ok:
             print(response.text)
@@ -97,15 +228,7 @@ class ElasticWrap:
         if refresh:
             self.url = f"{self.url}/?refresh=true"
 
-        kwargs: dict[str, Any] = {
-            "json": data,
-            "auth": self.auth,
-        }
-
-        if EnvironmentSettings.ES_DISABLE_VERIFY_SSL:
-            kwargs["verify"] = False
-
-        response = requests.put(self.url, **kwargs)
+        response = self.session.put(self.url, **self._build_body(data))
 
         if not response.ok:
             print(response.text)
@@ -125,15 +248,11 @@ class ElasticWrap:
         if refresh:
             self.url = f"{self.url}/?refresh=true"
 
-        kwargs: dict[str, Any] = {"auth": self.auth}
-
+        kwargs: dict[str, Any] = {}
         if data:
-            kwargs["json"] = data
-
-        if EnvironmentSettings.ES_DISABLE_VERIFY_SSL:
-            kwargs["verify"] = False
+            kwargs.update(self._build_body(data))
 
-        response = requests.delete(self.url, **kwargs)
+        response = self.session.delete(self.url, **kwargs)
 
         if print_error and not response.ok:
             print(response.text)
@@ -141,6 +260,160 @@ class ElasticWrap:
         return response.json(), response.status_code
 
 
+class ElasticBulk:
+    """buffer actions for _bulk, flush when max_actions, max_bytes
+    or max_age is reached
+    flush on exit of context manager, failed items collect in self.failed
+    items rejected with 429 are retried with backoff, nothing else is sent
+    twice
+    threadsafe, can be shared between workers
+    """
+
+    MAX_RETRIES = 3
+    BACKOFF = 2
+
+    def __init__(
+        self,
+        max_actions: int = 100,
+        max_age: int = 30,
+        refresh: bool = False,
+        max_bytes: int | None = None,
+    ):
+        self.max_actions = max_actions
+        self.max_age = max_age
+        self.refresh = refresh
+        self.max_bytes = max_bytes
+        self.pairs: list[tuple[str, str | None]] = []
+        self.size: int = 0
+        self.started: float | None = None
+        self.failed: list[dict] = []
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def index(self, index_name: str, doc_id: str, source: dict) -> None:
+        """add or replace document"""
+        action = {"index": {"_index": index_name, "_id": doc_id}}
+        self._add(action, source)
+
+    def update(self, index_name: str, doc_id: str, doc: dict) -> None:
+        """partial update of document"""
+        action = {"update": {"_index": index_name, "_id": doc_id}}
+        self._add(action, {"doc": doc})
+
+    def delete(self, index_name: str, doc_id: str) -> None:
+        """delete document by id"""
+        action = {"delete": {"_index": index_name, "_id": doc_id}}
+        self._add(action)
+
+    def _add(self, action: dict, source: dict | None = None) -> None:
+        """add action to buffer, flush if due, send outside of lock"""
+        with self._lock:
+            if self.started is None:
+                self.started = monotonic()
+
+            source_str = None
+            if source is not None:
+                source_str = json.dumps(source)
+                self.size += len(source_str)
+
+            self.pairs.append((json.dumps(action), source_str))
+            is_full = len(self.pairs) >= self.max_actions
+            if self.max_bytes and self.size >= self.max_bytes:
+                is_full = True
+
+            is_old = monotonic() - self.started >= self.max_age
+
+        if is_full or is_old:
+            self.flush()
+
+    def flush(self) -> list[dict]:
+        """send buffered actions, return failed items of this flush"""
+        with self._lock:
+            if not self.pairs:
+                return []
+
+            pairs = self.pairs
+            self.pairs, self.started, self.size = [], None, 0
+
+        failed = self._send(pairs)
+        with self._lock:
+            self.failed.extend(failed)
+
+        return failed
+
+    def _send(self, pairs) -> list[dict]:
+        """post pairs, retry rejected with backoff, return failed"""
+        path = "_bulk?refresh=true" if self.refresh else "_bulk"
+        failed: list[dict] = []
+        for attempt in range(self.MAX_RETRIES + 1):
+            if attempt:
+                sleep(self.BACKOFF**attempt)
+
+            response, status_code = ElasticWrap(path).post(
+                self._build_body(pairs), ndjson=True
+            )
+            if status_code == 429:
+                # whole request rejected, nothing applied
+                continue
+
+            if status_code not in [200, 201]:
+                return [{"status": status_code, "error": response}]
+
+            pairs = self._parse_errors(pairs, response, failed)
+            if not pairs:
+                return failed
+
+        print(f"bulk: {len(pairs)} items still rejected after retries")
+        failed.extend({"status": 429, "action": i[0]} for i in pairs)
+
+        return failed
+
+    @staticmethod
+    def _build_body(pairs) -> str:
+        """build nd-json request body from pairs"""
+        lines = []
+        for action, source in pairs:
+            lines.append(action)
+            if source is not None:
+                lines.append(source)
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _parse_errors(pairs, response: dict, failed: list[dict]) -> list:
+        """collect failed items, return pairs rejected with 429"""
+        if not response.get("errors", False):
+            return []
+
+        rejected = []
+        for pair, item in zip(pairs, response.get("items", [])):
+            action, result = next(iter(item.items()))
+            if "error" not in result:
+                continue
+
+            if result.get("status") == 429:
+                rejected.append(pair)
+                continue
+
+            failed.append(
+                {
+                    "_id": result.get("_id"),
+                    "_index": result.get("_index"),
+                    "action": action,
+                    "status": result.get("status"),
+                    "error": result.get("error"),
+                }
+            )
+            print(f"{result.get('_id')}: bulk {action} failed: {result}")
+
+        return rejected
+
+
 class IndexPaginate:
     """use search_after to go through whole index
     kwargs:
@@ -151,9 +424,18 @@ class IndexPaginate:
     - total: int, total items in index for progress message
     - timeout: int, overwrite timeout in get request
     - pit_keep_alive: int, overwrite pit valid
+    - slices: int, read N slices of the same pit concurrently
+    - ordered: bool, with slices, return slice by slice instead of
+      pages in order of arrival
+    - docvalue_fields: list, skip _source and return these fields only,
+      for keyword fields like ids
+
+    use iter_pages or iter_hits to stream results with fixed memory,
+    get_results collects all hits into one list
     """
 
     DEFAULT_SIZE = 500
+    MAX_SLICES = 8
 
     def __init__(self, index_name, data, **kwargs):
         self.index_name = index_name
@@ -163,11 +445,53 @@ class IndexPaginate:
 
     def get_results(self):
         """get all results, add task and total for notifications"""
+        return list(self.iter_hits())
+
+    def run_callback(self) -> int:
+        """run callback for every page without collecting, return processed"""
+        processed = 0
+        for all_hits in self.iter_pages():
+            processed += len(all_hits)
+
+        return processed
+
+    def iter_hits(self):
+        """yield hits one by one, _source or flat docvalue_fields dict"""
+        for all_hits in self.iter_pages():
+            for hit in all_hits:
+                yield self._parse_hit(hit)
+
+    def iter_pages(self):
+        """yield raw hits page by page, run callback and notify per page"""
         self.get_pit()
-        self.validate_data()
-        all_results = self.run_loop()
-        self.clean_pit()
-        return all_results
+        try:
+            self.validate_data()
+            processed = 0
+            for counter, all_hits in enumerate(self._get_pages()):
+                processed += len(all_hits)
+                if self.kwargs.get("callback"):
+                    self.kwargs.get("callback")(
+                        all_hits, self.index_name, counter=counter
+                    ).run()
+
+                if self.kwargs.get("task"):
+                    print(f"{self.index_name}: processing page {counter}")
+                    self._notify(processed)
+
+                yield all_hits
+        finally:
+            self.clean_pit()
+
+    def _parse_hit(self, hit: dict) -> dict:
+        """extract result from single hit"""
+        if self.kwargs.get("keep_source"):
+            return hit
+
+        if self.kwargs.get("docvalue_fields"):
+            fields = hit.get("fields", {})
+            return {key: value[0] for key, value in fields.items()}
+
+        return hit["_source"]
 
     def get_pit(self):
         """get pit for index"""
@@ -187,44 +511,107 @@ class IndexPaginate:
         if "sort" not in self.data.keys():
             self.data.update({"sort": [{"_doc": {"order": "desc"}}]})
 
+        if docvalue_fields := self.kwargs.get("docvalue_fields"):
+            self.data["_source"] = False
+            self.data["docvalue_fields"] = docvalue_fields
+
         self.data["size"] = self.kwargs.get("size") or self.DEFAULT_SIZE
         self.data["pit"] = {"id": self.pit_id, "keep_alive": "15m"}
 
-    def run_loop(self):
-        """loop through results until last hit"""
-        all_results = []
-        counter = 0
-        while True:
-            get_kwargs = {"data": self.data}
-            if timeout_overwrite := self.kwargs.get("timeout"):
-                get_kwargs.update({"timeout": timeout_overwrite})
-
+    def _get_pages(self):
+        """yield pages of hits, sliced if requested"""
+        slices = min(self.kwargs.get("slices") or 1, self.MAX_SLICES)
+        if slices > 1:
+            yield from self._get_sliced_pages(slices)
+        else:
+            yield from self._get_slice_pages(self.data)
+
+    def _get_slice_pages(self, data, stop_event=None):
+        """yield pages of a single search_after loop"""
+        get_kwargs = {"data": data}
+        if timeout_overwrite := self.kwargs.get("timeout"):
+            get_kwargs.update({"timeout": timeout_overwrite})
+
+        while not (stop_event and stop_event.is_set()):
             response, _ = ElasticWrap("_search").get(**get_kwargs)
             all_hits = response["hits"]["hits"]
             if not all_hits:
                 break
 
-            for hit in all_hits:
-                if self.kwargs.get("keep_source"):
-                    all_results.append(hit)
-                else:
-                    all_results.append(hit["_source"])
-
-            if self.kwargs.get("callback"):
-                self.kwargs.get("callback")(
-                    all_hits, self.index_name, counter=counter
-                ).run()
-
-            if self.kwargs.get("task"):
-                print(f"{self.index_name}: processing page {counter}")
-                self._notify(len(all_results))
-
-            counter += 1
+            yield all_hits
 
             # update search_after with last hit data
-            self.data["search_after"] = all_hits[-1]["sort"]
-
-        return all_results
+            data["search_after"] = all_hits[-1]["sort"]
+
+    def _get_sliced_pages(self, slices):
+        """read all slices of pit concurrently, yield pages from main thread
+        callbacks and notifications stay on the calling thread
+        """
+        page_queue: queue.Queue = queue.Queue(maxsize=slices * 2)
+        stop_event = threading.Event()
+        ordered = self.kwargs.get("ordered", False)
+
+        executor = ThreadPoolExecutor(max_workers=slices)
+        try:
+            for slice_id in range(slices):
+                executor.submit(
+                    self._read_slice, slice_id, slices, page_queue, stop_event
+                )
+
+            yield from self._collect_sliced(page_queue, slices, ordered)
+        finally:
+            stop_event.set()
+            executor.shutdown(wait=True)
+
+    def _read_slice(self, slice_id, slices, page_queue, stop_event):
+        """worker: put all pages of slice into queue, None when done"""
+        data = deepcopy(self.data)
+        data["slice"] = {"id": slice_id, "max": slices}
+        try:
+            for all_hits in self._get_slice_pages(data, stop_event):
+                self._put_page(page_queue, stop_event, (slice_id, all_hits))
+        except Exception as err:  # pylint: disable=broad-except
+            self._put_page(page_queue, stop_event, (slice_id, err))
+            return
+
+        self._put_page(page_queue, stop_event, (slice_id, None))
+
+    @staticmethod
+    def _put_page(page_queue, stop_event, item):
+        """blocking put, give up when consumer is gone"""
+        while not stop_event.is_set():
+            try:
+                page_queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    @staticmethod
+    def _collect_sliced(page_queue, slices, ordered):
+        """yield pages from queue as they arrive or in slice order"""
+        buffered: dict[int, list] = {i: [] for i in range(slices)}
+        done: set[int] = set()
+        current = 0
+        while len(done) < slices:
+            slice_id, all_hits = page_queue.get()
+            if isinstance(all_hits, Exception):
+                raise all_hits
+
+            if all_hits is None:
+                done.add(slice_id)
+            elif ordered:
+                buffered[slice_id].append(all_hits)
+            else:
+                yield all_hits
+
+            # in order: drain finished slices, then what's there of current
+            while ordered and current < slices:
+                yield from buffered[current]
+                buffered[current] = []
+                if current not in done:
+                    break
+
+                current += 1
 
     def _notify(self, processed):
         """send notification on task"""
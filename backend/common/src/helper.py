@@ -16,6 +16,9 @@ from urllib.parse import urlparse
 import requests
 from common.src.es_connect import IndexPaginate
 
+# stay below default index.max_terms_count of 65536
+TERMS_BATCH = 10000
+
 
 def ignore_filelist(filelist: list[str]) -> list[str]:
     """ignore temp files for os.listdir sanitizer"""
@@ -284,17 +287,31 @@ def is_missing(
     if isinstance(to_check, str):
         to_check = [to_check]
 
-    data = {
-        "query": {"terms": {on_key: to_check}},
-        "_source": [on_key],
-    }
-    result = IndexPaginate(index_name, data=data).get_results()
-    existing_ids = [i[on_key] for i in result]
+    existing_ids: set[str] = set()
+    for idx in range(0, len(to_check), TERMS_BATCH):
+        end = idx + TERMS_BATCH
+        query = {"terms": {on_key: to_check[idx:end]}}
+        existing_ids.update(get_ids(index_name, on_key, query=query))
+
     dl = [i for i in to_check if i not in existing_ids]
 
     return dl
 
 
+def get_ids(
+    index_name: str,
+    on_key: str = "youtube_id",
+    query: dict | None = None,
+    slices: int = 1,
+) -> set[str]:
+    """set of on_key values matching query, streamed from docvalues"""
+    data = {"query": query or {"match_all": {}}}
+    paginate = IndexPaginate(
+        index_name, data=data, docvalue_fields=[on_key], slices=slices
+    )
+    return {i[on_key] for i in paginate.iter_hits() if on_key in i}
+
+
 def get_channel_overwrites() -> dict[str, dict[str, Any]]:
     """get overwrites indexed my channel_id"""
     data = {
@@ -22,10 +22,10 @@ class YouTubeItem:
         "noplaylist": True,
     }
 
-    def __init__(self, youtube_id):
+    def __init__(self, youtube_id, config=None):
         self.youtube_id = youtube_id
         self.es_path = f"{self.index_name}/_doc/{youtube_id}"
-        self.config = AppConfig().config
+        self.config = config or AppConfig().config
         self.error = None
         self.youtube_meta = False
         self.json_data = False
@@ -0,0 +1,58 @@
+"""
+functionality:
+- thread safe rate limit for outgoing requests
+- shared limiter per host within the process
+- global backoff for all threads of a host
+"""
+
+import threading
+from time import monotonic, sleep
+
+
+class RateLimiter:
+    """spread calls evenly to max per_minute, shared by all threads"""
+
+    _hosts: dict[str, "RateLimiter"] = {}
+    _hosts_lock = threading.Lock()
+
+    def __init__(self, per_minute: int | None = None):
+        self.interval: float = 60 / per_minute if per_minute else 0
+        self.next_slot: float = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_host(cls, host: str, per_minute: int | None) -> "RateLimiter":
+        """get shared limiter for host, update rate if changed"""
+        with cls._hosts_lock:
+            limiter = cls._hosts.get(host)
+            if limiter is None:
+                limiter = cls(per_minute)
+                cls._hosts[host] = limiter
+            else:
+                limiter.set_rate(per_minute)
+
+        return limiter
+
+    def set_rate(self, per_minute: int | None) -> None:
+        """change rate"""
+        with self.lock:
+            self.interval = 60 / per_minute if per_minute else 0
+
+    def backoff(self, secs: float) -> None:
+        """pause all threads sharing this limiter for secs"""
+        with self.lock:
+            self.next_slot = max(self.next_slot, monotonic() + secs)
+
+    def wait(self) -> float:
+        """block until next slot is available, return secs waited"""
+        with self.lock:
+            now = monotonic()
+            start = max(now, self.next_slot)
+            if self.interval:
+                self.next_slot = start + self.interval
+
+        to_wait = start - now
+        if to_wait > 0:
+            sleep(to_wait)
+
+        return to_wait
@@ -40,8 +40,8 @@ class SearchProcess:
         if not match_video_user_progress:
             return None
 
-        query = f"{match_video_user_progress}:progress:*"
-        all_positions = RedisArchivist().list_items(query)
+        key = f"{match_video_user_progress}:progress"
+        all_positions = RedisArchivist().list_hash_items(key)
         if not all_positions:
             return None
 
@@ -3,6 +3,7 @@ functionality:
 - interact with redis
 - hold temporary download queue in redis
 - interact with celery tasks results
+- cache processed stats
 """
 
 import json
@@ -15,6 +16,7 @@ class RedisBase:
     """connection base for redis"""
 
     NAME_SPACE: str = EnvironmentSettings.REDIS_NAME_SPACE
+    SCAN_COUNT: int = 1000
 
     def __init__(self):
         self.conn = redis.from_url(
@@ -90,22 +92,49 @@ class RedisArchivist(RedisBase):
         return {"status": False}
 
     def list_keys(self, query: str) -> list:
-        """return all key matches"""
-        reply = self.conn.execute_command(
-            "KEYS", self.NAME_SPACE + query + "*"
+        """return all key matches, non blocking SCAN"""
+        reply = self.conn.scan_iter(
+            match=self.NAME_SPACE + query + "*", count=self.SCAN_COUNT
         )
-        if not reply:
-            return []
-
-        return [i.lstrip(self.NAME_SPACE) for i in reply]
+        return [i.removeprefix(self.NAME_SPACE) for i in reply]
 
     def list_items(self, query: str) -> list:
-        """list all matches"""
+        """list all matches, fetched with single MGET"""
         all_matches = self.list_keys(query)
         if not all_matches:
             return []
 
-        return [self.get_message_dict(i) for i in all_matches]
+        keys = [self.NAME_SPACE + i for i in all_matches]
+        reply = self.conn.mget(keys)
+
+        return [json.loads(i) for i in reply if i]
+
+    def set_hash_message(self, key: str, field: str, message: dict) -> None:
+        """write message to field of hash"""
+        self.conn.hset(self.NAME_SPACE + key, field, json.dumps(message))
+
+    def get_hash_message(self, key: str, field: str) -> dict:
+        """get message dict from field of hash"""
+        reply = self.conn.hget(self.NAME_SPACE + key, field)
+        if not reply:
+            return {}
+
+        return json.loads(reply)
+
+    def list_hash_items(self, key: str) -> list[dict]:
+        """get all message dicts of hash in one round trip"""
+        reply = self.conn.hvals(self.NAME_SPACE + key)
+        return [json.loads(i) for i in reply]
+
+    def del_hash_message(self, key: str, fields: str | list[str]) -> int:
+        """delete one or more fields from hash"""
+        if isinstance(fields, str):
+            fields = [fields]
+
+        if not fields:
+            return 0
+
+        return self.conn.hdel(self.NAME_SPACE + key, *fields)
 
     def del_message(self, key: str, save: bool = False) -> bool:
         """delete key from redis"""
@@ -116,6 +145,62 @@ class RedisArchivist(RedisBase):
         return response
 
 
+class StatsCache:
+    """cache processed aggregations in redis
+    expire after TTL, invalidate on download, delete and watched change
+    cached keys are tracked in a set, no keyspace scan to invalidate,
+    rollup keys of completed days are tracked separately
+    """
+
+    PREFIX: str = "stats:"
+    TRACKED: str = "stats-tracked"
+    TRACKED_ROLLUP: str = "stats-tracked:rollup"
+
+    @classmethod
+    def get(cls, key: str):
+        """get cached result, None if not cached"""
+        cached = RedisArchivist().get_message_dict(cls.PREFIX + key)
+        if not cached:
+            return None
+
+        return cached.get("data")
+
+    @classmethod
+    def set(cls, key: str, data, expire: int, rollup: bool = False) -> None:
+        """cache result"""
+        redis = RedisArchivist()
+        tracked = cls.TRACKED_ROLLUP if rollup else cls.TRACKED
+        pipe = redis.conn.pipeline(transaction=False)
+        pipe.set(
+            redis.NAME_SPACE + cls.PREFIX + key,
+            json.dumps({"data": data}),
+            ex=expire,
+        )
+        pipe.sadd(redis.NAME_SPACE + tracked, key)
+        pipe.execute()
+
+    @classmethod
+    def invalidate(cls, rollup: bool = False) -> None:
+        """drop tracked cached stats, call after index changes
+        rollup: also drop rollups, after deleting videos
+        """
+        redis = RedisArchivist()
+        to_clear = (
+            [cls.TRACKED, cls.TRACKED_ROLLUP] if rollup else [cls.TRACKED]
+        )
+        pipe = redis.conn.pipeline(transaction=True)
+        for tracked in to_clear:
+            pipe.smembers(redis.NAME_SPACE + tracked)
+            pipe.delete(redis.NAME_SPACE + tracked)
+
+        response = pipe.execute()
+        keys = set().union(*response[::2])
+        if keys:
+            redis.conn.delete(
+                *[redis.NAME_SPACE + cls.PREFIX + i for i in keys]
+            )
+
+
 class RedisQueue(RedisBase):
     """
     dynamically interact with queues in redis using sorted set
@@ -198,21 +283,31 @@ class RedisQueue(RedisBase):
 
         return item, idx
 
+    def put_back(self, element: str, idx: int) -> None:
+        """return claimed element to its previous position"""
+        self.conn.zadd(self.key, {element: idx})
+
     def clear(self) -> None:
         """delete list from redis"""
         self.conn.delete(self.key)
 
 
 class TaskRedis(RedisBase):
-    """interact with redis tasks"""
+    """interact with redis tasks
+    registry indexes task ids by name and pending status, entries with
+    expired or finished results are pruned on read
+    """
 
     BASE: str = "celery-task-meta-"
     EXPIRE: int = 60 * 60 * 24
     COMMANDS: list[str] = ["STOP", "KILL"]
+    REGISTRY: str = RedisBase.NAME_SPACE + "task:"
 
     def get_all(self) -> list:
-        """return all tasks"""
-        all_keys = self.conn.execute_command("KEYS", f"{self.BASE}*")
+        """return all tasks, non blocking SCAN"""
+        all_keys = self.conn.scan_iter(
+            match=f"{self.BASE}*", count=self.SCAN_COUNT
+        )
         return [i.replace(self.BASE, "") for i in all_keys]
 
     def get_single(self, task_id: str) -> dict:
@@ -223,6 +318,67 @@ class TaskRedis(RedisBase):
 
         return json.loads(result)
 
+    def get_many(self, task_ids: list[str]) -> list[dict | None]:
+        """return content of tasks with single MGET, None if missing"""
+        if not task_ids:
+            return []
+
+        reply = self.conn.mget([self.BASE + i for i in task_ids])
+        return [json.loads(i) if i else None for i in reply]
+
+    def register(
+        self, task_id: str, task_name: str, message: dict | None = None
+    ) -> None:
+        """add task to registry, optionally set initial message"""
+        name_key = f"{self.REGISTRY}name:{task_name}"
+        pipe = self.conn.pipeline()
+        if message:
+            pipe.set(self.BASE + task_id, json.dumps(message))
+            if message.get("status") == "PENDING":
+                pipe.sadd(f"{self.REGISTRY}pending", task_id)
+
+        pipe.sadd(f"{self.REGISTRY}names", task_name)
+        pipe.sadd(name_key, task_id)
+        pipe.expire(name_key, self.EXPIRE)
+        pipe.execute()
+
+    def get_names(self) -> list[str]:
+        """return all registered task names"""
+        return list(self.conn.smembers(f"{self.REGISTRY}names"))
+
+    def get_by_name(self, task_name: str) -> list[dict]:
+        """return all task results of task_name"""
+        name_key = f"{self.REGISTRY}name:{task_name}"
+        task_ids = list(self.conn.smembers(name_key))
+        return self._get_indexed(name_key, task_ids)
+
+    def get_pending(self, task_name: str) -> list[dict]:
+        """return pending task results of task_name"""
+        pending_key = f"{self.REGISTRY}pending"
+        name_key = f"{self.REGISTRY}name:{task_name}"
+        task_ids = list(self.conn.sinter(pending_key, name_key))
+        results = self._get_indexed(pending_key, task_ids, "PENDING")
+
+        return results
+
+    def _get_indexed(
+        self, index_key: str, task_ids: list[str], status: str | None = None
+    ) -> list[dict]:
+        """MGET task_ids, remove stale from index_key"""
+        results = []
+        stale = []
+        for task_id, result in zip(task_ids, self.get_many(task_ids)):
+            if not result or (status and result.get("status") != status):
+                stale.append(task_id)
+                continue
+
+            results.append(result)
+
+        if stale:
+            self.conn.srem(index_key, *stale)
+
+        return results
+
     def set_key(
         self, task_id: str, message: dict, expire: bool | int = False
     ) -> None:
@@ -6,7 +6,7 @@ functionality:
 from datetime import datetime
 
 from common.src.es_connect import ElasticWrap
-from common.src.ta_redis import RedisArchivist
+from common.src.ta_redis import RedisArchivist, StatsCache
 from common.src.urlparser import Parser
 
 
@@ -26,6 +26,7 @@ class WatchState:
         url_type = self._dedect_type()
         if url_type == "video":
             self.change_vid_state()
+            StatsCache.invalidate()
             return
 
         if url_type == "channel":
@@ -38,6 +39,7 @@ class WatchState:
         data = self._build_update_data(url_type)
         _, _ = ElasticWrap(path).post(data)
         self._delete_pipeline()
+        StatsCache.invalidate()
 
     def _dedect_type(self):
         """find youtube id type"""
@@ -52,8 +54,8 @@ class WatchState:
         if self.is_watched:
             data["doc"]["player"]["watched_date"] = self.stamp
         response, status_code = ElasticWrap(path).post(data=data)
-        key = f"{self.user_id}:progress:{self.youtube_id}"
-        RedisArchivist().del_message(key)
+        key = f"{self.user_id}:progress"
+        RedisArchivist().del_hash_message(key, self.youtube_id)
         if status_code != 200:
             print(response)
             raise ValueError("failed to mark video as watched")
@@ -76,12 +78,8 @@ class WatchState:
 
     def _reset_list(self, video_ids: list[str]):
         """reset list of video ids"""
-        redis_con = RedisArchivist()
-        all_ids = redis_con.list_keys(f"{self.user_id}:progress")
-        for progress_id in all_ids:
-            video_id = progress_id.split(":")[-1]
-            if video_id in video_ids:
-                redis_con.del_message(progress_id)
+        key = f"{self.user_id}:progress"
+        RedisArchivist().del_hash_message(key, video_ids)
 
     def _build_update_data(self, url_type):
         """build update by query data based on url_type"""
@@ -66,6 +66,7 @@ class Command(BaseCommand):
         self._mig_fix_channel_art_types()
         self._mig_fix_channel_description()
         self._mig_fix_video_description()
+        self._mig_progress_to_hash()
 
     @property
     def skip_migrations(self) -> bool:
@@ -479,6 +480,27 @@ class Command(BaseCommand):
             noop_msg = "    no items needed updating"
             self.stdout.write(self.style.SUCCESS(noop_msg))
 
+    def _mig_progress_to_hash(self) -> None:
+        """migrate from 0.5.10 to 0.5.11, move user progress keys to hash"""
+        self.stdout.write("[MIGRATION] move video progress to user hash")
+        redis_con = RedisArchivist()
+        old_keys = redis_con.list_keys("*:progress:")
+        for old_key in old_keys:
+            user_id, _, youtube_id = old_key.split(":")
+            message = redis_con.get_message_dict(old_key)
+            if message and not message.get("watched"):
+                key = f"{user_id}:progress"
+                redis_con.set_hash_message(key, youtube_id, message)
+
+            redis_con.del_message(old_key)
+
+        if old_keys:
+            suc_msg = f"    ✓ moved {len(old_keys)} progress keys"
+            self.stdout.write(self.style.SUCCESS(suc_msg))
+        else:
+            noop_msg = "    no items needed updating"
+            self.stdout.write(self.style.SUCCESS(noop_msg))
+
     def _run_migration(
         self, index_name: str, desc: str, query: dict, script: dict
     ):
@@ -16,13 +16,14 @@ from common.src.es_connect import ElasticWrap, IndexPaginate
 from common.src.helper import (
     get_channels,
     get_duration_str,
+    get_ids,
     is_shorts,
     rand_sleep,
 )
 from common.src.urlparser import ParsedURLType
 from download.serializers import DownloadItemSerializer
-from download.src.queue_interact import PendingInteract
-from download.src.thumbnails import ThumbManager
+from download.src.queue_interact import PendingInteract, PendingQueue
+from download.src.thumbnails import ThumbBatch
 from playlist.src.index import YoutubePlaylist
 from video.src.constants import VideoTypeEnum
 from video.src.index import YoutubeVideo
@@ -34,11 +35,10 @@ class PendingIndex:
     def __init__(self):
         self.all_pending = False
         self.all_ignored = False
-        self.all_videos = False
         self.all_channels = False
         self.channel_overwrites = False
         self.video_overwrites = False
-        self.to_skip = False
+        self.to_skip: set[str] = set()
 
     def get_download(self):
         """get a list of all pending videos in ta_download"""
@@ -50,24 +50,18 @@ class PendingIndex:
 
         self.all_pending = []
         self.all_ignored = []
-        self.to_skip = []
+        self.to_skip = set()
 
         for result in all_results:
-            self.to_skip.append(result["youtube_id"])
+            self.to_skip.add(result["youtube_id"])
             if result["status"] == "pending":
                 self.all_pending.append(result)
             elif result["status"] == "ignore":
                 self.all_ignored.append(result)
 
     def get_indexed(self):
-        """get a list of all videos indexed"""
-        data = {
-            "query": {"match_all": {}},
-            "sort": [{"published": {"order": "desc"}}],
-        }
-        self.all_videos = IndexPaginate("ta_video", data).get_results()
-        for video in self.all_videos:
-            self.to_skip.append(video["youtube_id"])
+        """add ids of all videos indexed to skip"""
+        self.to_skip.update(get_ids("ta_video", slices=4))
 
     def get_channels(self):
         """get a list of all channels indexed"""
@@ -121,8 +115,9 @@ class PendingList(PendingIndex):
         self.auto_start = auto_start
         self.flat = flat
         self.force = force
-        self.to_skip = False
+        self.to_skip: set[str] = set()
         self.missing_videos: list[dict] = []
+        self.missing_thumbs: list[tuple[str, str, str]] = []
         self.added = 0
 
     def parse_url_list(self, status="pending") -> int:
@@ -348,7 +343,7 @@ class PendingList(PendingIndex):
         if not to_add:
             return None
 
-        ThumbManager(item_id=url).download_video_thumb(to_add["vid_thumb_url"])
+        self.missing_thumbs.append((url, "video", to_add["vid_thumb_url"]))
         rand_sleep(self.config)
 
         return to_add
@@ -466,6 +461,10 @@ class PendingList(PendingIndex):
             return 0
 
         self._notify_start(total)
+        if self.missing_thumbs:
+            ThumbBatch().download(self.missing_thumbs)
+            self.missing_thumbs = []
+
         bulk_list = []
         for video_entry in self.missing_videos:
             video_entry.update(
@@ -475,6 +474,7 @@ class PendingList(PendingIndex):
                 }
             )
             video_id = video_entry["youtube_id"]
+            self.to_skip.add(video_id)
             action = {"index": {"_index": "ta_download", "_id": video_id}}
             bulk_list.append(json.dumps(action))
             bulk_list.append(json.dumps(video_entry))
@@ -500,6 +500,8 @@ class PendingList(PendingIndex):
         else:
             self._notify_done(total)
 
+        PendingQueue().invalidate()
+
         return len(self.missing_videos)
 
     def _notify_add(
@@ -1,6 +1,14 @@
-"""interact with queue items"""
+"""
+functionality:
+- interact with queue items
+- mirror pending queue in redis for dequeue
+"""
 
-from common.src.es_connect import ElasticWrap
+import json
+
+import redis
+from common.src.es_connect import ElasticWrap, IndexPaginate
+from common.src.ta_redis import RedisBase
 
 
 class PendingInteract:
@@ -14,6 +22,7 @@ class PendingInteract:
         """delete single item from pending"""
         path = f"ta_download/_doc/{self.youtube_id}"
         _, _ = ElasticWrap(path).delete(refresh=True, print_error=print_error)
+        PendingQueue().invalidate()
 
     def delete_bulk(self, channel_id: str | None, vid_type: str | None):
         """delete all matching item by status"""
@@ -28,6 +37,7 @@ class PendingInteract:
 
         path = "ta_download/_delete_by_query?refresh=true"
         _, _ = ElasticWrap(path).post(data=data)
+        PendingQueue().invalidate()
 
     def update_bulk(
         self,
@@ -71,6 +81,7 @@ class PendingInteract:
 
         path = "ta_download/_update_by_query?refresh=true"
         _, _ = ElasticWrap(path).post(data)
+        PendingQueue().invalidate()
 
     def update_status(self):
         """update status of pending item"""
@@ -87,6 +98,7 @@ class PendingInteract:
 
         path = f"ta_download/_update/{self.youtube_id}/?refresh=true"
         _, _ = ElasticWrap(path).post(data=data)
+        PendingQueue().invalidate()
 
     def get_item(self):
         """return pending item dict"""
@@ -113,3 +125,153 @@ class PendingInteract:
             "channel_id": self.youtube_id,
             "channel_name": channel_name,
         }
+
+
+class PendingQueue(RedisBase):
+    """
+    mirror of pending download queue in redis sorted set
+    - ta_download in ES stays the durable copy
+    - score orders auto_start first, then by timestamp
+    - claimed ids are tracked for the current run, so a resync from ES
+      doesn't return items already taken
+    - any change to ta_download invalidates the mirror, the next dequeue
+      resyncs from ES
+    - invalidate bumps the generation, a sync overlapping with it is
+      retried instead of marked synced
+    """
+
+    QUEUE_KEY = "download:pending"
+    DATA_KEY = "download:pending:data"
+    CLAIMED_KEY = "download:pending:claimed"
+    SYNCED_KEY = "download:pending:synced"
+    GENERATION_KEY = "download:pending:generation"
+    SYNC_ATTEMPTS = 3
+    PRIORITY_OFFSET = 10_000_000_000
+
+    # pop lowest score, keep auto_start only if requested, mark as claimed
+    CLAIM_SCRIPT = """
+    local popped = redis.call('ZPOPMIN', KEYS[1])
+    if #popped == 0 then
+        return nil
+    end
+    local youtube_id, score = popped[1], tonumber(popped[2])
+    if ARGV[1] == '1' and score >= 0 then
+        redis.call('ZADD', KEYS[1], score, youtube_id)
+        return nil
+    end
+    local data = redis.call('HGET', KEYS[2], youtube_id)
+    redis.call('HDEL', KEYS[2], youtube_id)
+    redis.call('SADD', KEYS[3], youtube_id)
+    return data
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.queue_key = self.NAME_SPACE + self.QUEUE_KEY
+        self.data_key = self.NAME_SPACE + self.DATA_KEY
+        self.claimed_key = self.NAME_SPACE + self.CLAIMED_KEY
+        self.synced_key = self.NAME_SPACE + self.SYNCED_KEY
+        self.generation_key = self.NAME_SPACE + self.GENERATION_KEY
+
+    def get_next(self, auto_only: bool = False) -> dict | None:
+        """claim next item in queue, resync from ES if invalidated"""
+        video_data = self._claim(auto_only)
+        if video_data or self.conn.exists(self.synced_key):
+            return video_data
+
+        self.sync()
+
+        return self._claim(auto_only)
+
+    def _claim(self, auto_only: bool) -> dict | None:
+        """atomically claim next item"""
+        claim = self.conn.register_script(self.CLAIM_SCRIPT)
+        keys = [self.queue_key, self.data_key, self.claimed_key]
+        reply = claim(keys=keys, args=[int(auto_only)])
+        if not reply:
+            return None
+
+        return json.loads(reply)
+
+    def sync(self) -> int:
+        """load pending items from ES, skip already claimed"""
+        for _ in range(self.SYNC_ATTEMPTS):
+            try:
+                return self._sync_once()
+            except redis.WatchError:
+                print("[download] queue changed while syncing, retry")
+
+        # keep unsynced, next empty dequeue syncs again
+        return self._sync_once(mark_synced=False)
+
+    def _sync_once(self, mark_synced: bool = True) -> int:
+        """replace mirror with ES snapshot, raise WatchError if invalidated
+        while reading
+        """
+        with self.conn.pipeline() as pipeline:
+            if mark_synced:
+                pipeline.watch(self.generation_key)
+
+            scores, items = self._read_pending()
+            pipeline.multi()
+            pipeline.delete(self.queue_key, self.data_key)
+            if scores:
+                pipeline.zadd(self.queue_key, scores)
+                pipeline.hset(self.data_key, mapping=items)
+
+            if mark_synced:
+                pipeline.set(self.synced_key, 1)
+
+            pipeline.execute()
+
+        return len(scores)
+
+    def _read_pending(self) -> tuple[dict, dict]:
+        """get scores and items of pending, not yet claimed videos"""
+        data = {
+            "query": {
+                "bool": {
+                    "must": [{"term": {"status": {"value": "pending"}}}],
+                    "must_not": [{"exists": {"field": "message"}}],
+                }
+            },
+            "_source": [
+                "youtube_id",
+                "channel_id",
+                "vid_type",
+                "title",
+                "auto_start",
+                "timestamp",
+            ],
+        }
+        claimed = self.conn.smembers(self.claimed_key)
+        scores, items = {}, {}
+        for video in IndexPaginate("ta_download", data).iter_hits():
+            youtube_id = video["youtube_id"]
+            if youtube_id in claimed:
+                continue
+
+            scores[youtube_id] = self._get_score(video)
+            items[youtube_id] = json.dumps(video)
+
+        return scores, items
+
+    def _get_score(self, video: dict) -> float:
+        """auto_start first, oldest first"""
+        score = float(video.get("timestamp") or 0)
+        if video.get("auto_start"):
+            score -= self.PRIORITY_OFFSET
+
+        return score
+
+    def invalidate(self) -> None:
+        """ta_download changed, resync on next dequeue"""
+        pipeline = self.conn.pipeline()
+        pipeline.incr(self.generation_key)
+        pipeline.delete(self.queue_key, self.data_key, self.synced_key)
+        pipeline.execute()
+
+    def clear(self) -> None:
+        """remove mirror and claimed ids, at start and end of queue run"""
+        self.invalidate()
+        self.conn.delete(self.claimed_key)
@@ -1,18 +1,24 @@
 """
 functionality:
 - handle download and caching for thumbnails
+- download batches of thumbnails concurrently
 - check for missing thumbnails
 """
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from time import sleep
+from typing import Any
 
 import requests
 from common.src.env_settings import EnvironmentSettings
 from common.src.es_connect import ElasticWrap, IndexPaginate
-from common.src.helper import is_missing
+from common.src.helper import get_ids, is_missing
 from mutagen.mp4 import MP4, MP4Cover
 from PIL import Image, ImageFile, UnidentifiedImageError
+from requests.adapters import HTTPAdapter
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
@@ -25,23 +31,49 @@ class ThumbManagerBase:
     VIDEO_DIR = os.path.join(CACHE_DIR, "videos")
     CHANNEL_DIR = os.path.join(CACHE_DIR, "channels")
     PLAYLIST_DIR = os.path.join(CACHE_DIR, "playlists")
+    POOL_SIZE = 8
+
+    _session: requests.Session | None = None
+    _pid: int | None = None
+    _lock = threading.Lock()
 
     def __init__(self, item_id, item_type, fallback=False):
         self.item_id = item_id
         self.item_type = item_type
         self.fallback = fallback
 
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """shared keep-alive session of current process"""
+        pid = os.getpid()
+        if cls._session is not None and cls._pid == pid:
+            return cls._session
+
+        with cls._lock:
+            if cls._session is None or cls._pid != pid:
+                adapter = HTTPAdapter(
+                    pool_connections=4, pool_maxsize=cls.POOL_SIZE
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._session = session
+                cls._pid = pid
+
+        return cls._session
+
     def download_raw(self, url):
         """download thumbnail for video"""
         if not url:
             return self.get_fallback()
 
+        session = self.get_session()
         for i in range(3):
             try:
-                response = requests.get(url, stream=True, timeout=5)
+                response = session.get(url, timeout=5)
                 if response.ok:
                     try:
-                        img = Image.open(response.raw)
+                        img = Image.open(BytesIO(response.content))
                         if isinstance(img, Image.Image):
                             return img
                         return self.get_fallback()
@@ -99,15 +131,15 @@ class ThumbManager(ThumbManagerBase):
     def __init__(self, item_id, item_type="video", fallback=False):
         super().__init__(item_id, item_type, fallback=fallback)
 
-    def download(self, url):
+    def download(self, url, skip_existing=False):
         """download thumbnail"""
         print(f"{self.item_id}: download {self.item_type} thumbnail")
         if self.item_type == "video":
-            self.download_video_thumb(url)
+            self.download_video_thumb(url, skip_existing)
         elif self.item_type == "channel":
-            self.download_channel_art(url)
+            self.download_channel_art(url, skip_existing)
         elif self.item_type == "playlist":
-            self.download_playlist_thumb(url)
+            self.download_playlist_thumb(url, skip_existing)
 
     def delete(self):
         """delete thumbnail file"""
@@ -224,44 +256,42 @@ class ThumbManager(ThumbManagerBase):
             return
 
         video = MP4(file_path)
+        self.set_video_art(video, self.get_video_art_paths(json_data))
+        video.save()
 
-        thumb_path = self.vid_thumb_path(absolute=True)
-        if os.path.exists(thumb_path):
-            with open(thumb_path, "rb") as f:
-                cover_data = f.read()
-
-            video["covr"] = [
-                MP4Cover(cover_data, imageformat=MP4Cover.FORMAT_JPEG)
-            ]
-
+    def get_video_art_paths(self, json_data: dict) -> dict[str, str]:
+        """expected artwork paths of video by mp4 key"""
         channel_id = json_data["channel"]["channel_id"]
-        banner_path = os.path.join(
-            self.CHANNEL_DIR, f"{channel_id}_banner.jpg"
-        )
-        self._embed_art_item(video, "channel_banner", art_path=banner_path)
-
-        channel_icon_path = os.path.join(
-            self.CHANNEL_DIR, f"{channel_id}_thumb.jpg"
-        )
-        self._embed_art_item(video, "channel_icon", art_path=channel_icon_path)
-
-        channel_tv_path = os.path.join(
-            self.CHANNEL_DIR, f"{channel_id}_tvart.jpg"
-        )
-        self._embed_art_item(video, "channel_tv", art_path=channel_tv_path)
-
-        playlist_ids = json_data.get("playlist", [])
-        for plalyist_id in playlist_ids:
-            playlist_path = os.path.join(
-                self.PLAYLIST_DIR, f"{plalyist_id}.jpg"
-            )
-            self._embed_art_item(
-                video, f"playlist_{plalyist_id}", art_path=playlist_path
+        art_paths = {
+            "covr": self.vid_thumb_path(absolute=True),
+            "channel_banner": os.path.join(
+                self.CHANNEL_DIR, f"{channel_id}_banner.jpg"
+            ),
+            "channel_icon": os.path.join(
+                self.CHANNEL_DIR, f"{channel_id}_thumb.jpg"
+            ),
+            "channel_tv": os.path.join(
+                self.CHANNEL_DIR, f"{channel_id}_tvart.jpg"
+            ),
+        }
+        for playlist_id in json_data.get("playlist", []):
+            art_paths[f"playlist_{playlist_id}"] = os.path.join(
+                self.PLAYLIST_DIR, f"{playlist_id}.jpg"
             )
 
-        video.save()
+        return art_paths
+
+    def set_video_art(self, video, art_paths: dict[str, str]) -> None:
+        """set existing artwork on mp4 object, without saving"""
+        for key, art_path in art_paths.items():
+            if key == "covr":
+                self._embed_art_item(video, key, art_path)
+            else:
+                mp4_key = f"----:com.tubearchivist:{key}"
+                self._embed_art_item(video, mp4_key, art_path)
 
-    def _embed_art_item(self, video, key, art_path):
+    @staticmethod
+    def _embed_art_item(video, key, art_path):
         """embed single item"""
         if not os.path.exists(art_path):
             return
@@ -269,9 +299,7 @@ class ThumbManager(ThumbManagerBase):
         with open(art_path, "rb") as f:
             art_data = f.read()
 
-        video[f"----:com.tubearchivist:{key}"] = [
-            MP4Cover(art_data, imageformat=MP4Cover.FORMAT_JPEG)
-        ]
+        video[key] = [MP4Cover(art_data, imageformat=MP4Cover.FORMAT_JPEG)]
 
     def delete_video_thumb(self):
         """delete video thumbnail if exists"""
@@ -299,6 +327,64 @@ class ThumbManager(ThumbManagerBase):
             os.remove(thumb_path)
 
 
+class ThumbBatch:
+    """download and encode many thumbnails on a bounded thread pool
+    items are tuples of (item_id, item_type, url) as for ThumbManager
+    """
+
+    WORKERS = ThumbManagerBase.POOL_SIZE
+
+    def __init__(self, skip_existing=False, workers=WORKERS):
+        self.skip_existing = skip_existing
+        self.workers = workers
+
+    def download(self, items: list[tuple[str, str, Any]]) -> list[str]:
+        """download all items, return list of failed item_ids"""
+        if not items:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                (item[0], executor.submit(self._download_single, *item))
+                for item in items
+            ]
+
+        failed = []
+        for item_id, future in futures:
+            err = future.exception()
+            if err:
+                print(f"{item_id}: thumbnail download failed: {err}")
+                failed.append(item_id)
+
+        return failed
+
+    def _download_single(self, item_id: str, item_type: str, url) -> None:
+        """download single item in worker thread"""
+        if self.skip_existing and self._exists(item_id, item_type):
+            return
+
+        ThumbManager(item_id, item_type=item_type).download(
+            url, skip_existing=self.skip_existing
+        )
+
+    @staticmethod
+    def _exists(item_id: str, item_type: str) -> bool:
+        """check if all artwork files of item are already cached"""
+        if item_type == "video":
+            paths = [ThumbManager(item_id).vid_thumb_path(absolute=True)]
+        elif item_type == "channel":
+            paths = [
+                os.path.join(ThumbManager.CHANNEL_DIR, f"{item_id}_{i}.jpg")
+                for i in ["thumb", "banner", "tvart"]
+            ]
+        elif item_type == "playlist":
+            paths = [os.path.join(ThumbManager.PLAYLIST_DIR, f"{item_id}.jpg")]
+        else:
+            return False
+
+        return all(os.path.exists(i) for i in paths)
+
+
 class ValidatorCallback:
     """handle callback validate thumbnails page by page"""
 
@@ -319,28 +405,40 @@ class ValidatorCallback:
 
     def _validate_videos(self):
         """check if video thumbnails are correct"""
-        for video in self.source:
-            url = video["_source"]["vid_thumb_url"]
-            handler = ThumbManager(video["_source"]["youtube_id"])
-            handler.download_video_thumb(url, skip_existing=True)
+        items = [
+            (
+                video["_source"]["youtube_id"],
+                "video",
+                video["_source"]["vid_thumb_url"],
+            )
+            for video in self.source
+        ]
+        ThumbBatch(skip_existing=True).download(items)
 
     def _validate_channels(self):
         """check if all channel artwork is there"""
+        items = []
         for channel in self.source:
             urls = (
                 channel["_source"].get("channel_thumb_url"),
                 channel["_source"].get("channel_banner_url"),
                 channel["_source"].get("channel_tvart_url"),
             )
-            handler = ThumbManager(channel["_source"]["channel_id"])
-            handler.download_channel_art(urls, skip_existing=True)
+            items.append((channel["_source"]["channel_id"], "channel", urls))
+
+        ThumbBatch(skip_existing=True).download(items)
 
     def _validate_playlists(self):
         """check if all playlist artwork is there"""
-        for playlist in self.source:
-            url = playlist["_source"]["playlist_thumbnail"]
-            handler = ThumbManager(playlist["_source"]["playlist_id"])
-            handler.download_playlist_thumb(url, skip_existing=True)
+        items = [
+            (
+                playlist["_source"]["playlist_id"],
+                "playlist",
+                playlist["_source"]["playlist_thumbnail"],
+            )
+            for playlist in self.source
+        ]
+        ThumbBatch(skip_existing=True).download(items)
 
 
 class ThumbValidator:
@@ -393,11 +491,12 @@ class ThumbValidator:
                 index_name=index["name"],
                 data=index["data"],
                 size=1000,
+                slices=4,
                 callback=ValidatorCallback,
                 task=self.task,
                 total=total,
             )
-            _ = paginate.get_results()
+            _ = paginate.run_callback()
 
     def clean_up(self):
         """clean up all thumbs"""
@@ -406,42 +505,42 @@ class ThumbValidator:
         self._clean_up_playlists()
 
     def _clean_up_vids(self):
-        """clean unneeded vid thumbs"""
+        """clean unneeded vid thumbs, diff cache against one id snapshot"""
         video_dir = os.path.join(EnvironmentSettings.CACHE_DIR, "videos")
-        video_folders = os.listdir(video_dir)
-        for video_folder in video_folders:
-            folder_path = os.path.join(video_dir, video_folder)
-            thumbs_is = {i.split(".")[0] for i in os.listdir(folder_path)}
-            thumbs_should = self._get_vid_thumbs_should(video_folder)
-            to_delete = thumbs_is - thumbs_should
-            for thumb in to_delete:
-                delete_path = os.path.join(folder_path, f"{thumb}.jpg")
-                os.remove(delete_path)
+        thumbs_should = get_ids("ta_video,ta_download", slices=4)
+        if not thumbs_should:
+            print("[thumbs][video] no indexed videos, skip clean up")
+            return
 
-            if to_delete:
-                message = (
-                    f"[thumbs][video][{video_folder}] "
-                    + f"delete {len(to_delete)} unused thumbnails"
-                )
-                print(message)
-                if self.task:
-                    self.task.send_progress([message])
+        with os.scandir(video_dir) as folders:
+            for folder in folders:
+                if not folder.is_dir():
+                    continue
 
-    @staticmethod
-    def _get_vid_thumbs_should(video_folder: str) -> set[str]:
-        """get indexed"""
-        should_list = [
-            {"prefix": {"youtube_id": {"value": video_folder.lower()}}},
-            {"prefix": {"youtube_id": {"value": video_folder.upper()}}},
-        ]
-        data = {
-            "query": {"bool": {"should": should_list}},
-            "_source": ["youtube_id"],
-        }
-        result = IndexPaginate("ta_video,ta_download", data).get_results()
-        thumbs_should = {i["youtube_id"] for i in result}
+                self._clean_up_vid_folder(folder, thumbs_should)
 
-        return thumbs_should
+    def _clean_up_vid_folder(self, folder, thumbs_should: set[str]):
+        """delete thumbs of single folder not in thumbs_should"""
+        deleted = 0
+        with os.scandir(folder.path) as thumbs:
+            for thumb in thumbs:
+                if not thumb.is_file():
+                    continue
+
+                if thumb.name.split(".")[0] in thumbs_should:
+                    continue
+
+                os.remove(thumb.path)
+                deleted += 1
+
+        if deleted:
+            message = (
+                f"[thumbs][video][{folder.name}] "
+                + f"delete {deleted} unused thumbnails"
+            )
+            print(message)
+            if self.task:
+                self.task.send_progress([message])
 
     def _clean_up_channels(self):
         """clean unneeded channel thumbs"""
@@ -509,11 +608,12 @@ class ThumbFilesystem:
             index_name=self.INDEX_NAME,
             data=data,
             size=100,
+            slices=4,
             callback=EmbedCallback,
             task=self.task,
             total=self._get_total(),
         )
-        _ = paginate.get_results()
+        _ = paginate.run_callback()
 
     def _get_total(self):
         """get total documents in index"""
@@ -24,6 +24,7 @@ class YtWrap:
         "not a bot",
     ]
     BOT_ERROR_LOG = "YouTube bot detection, abort!"
+    RATE_LIMIT_HOST = "youtube.com"
 
     OBS_BASE = {
         "default_search": "ytsearch",
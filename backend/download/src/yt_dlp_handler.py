@@ -8,26 +8,31 @@ functionality:
 
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from appsettings.src.config import AppConfig
 from channel.src.index import YoutubeChannel
 from common.src.env_settings import EnvironmentSettings
-from common.src.es_connect import ElasticWrap, IndexPaginate
+from common.src.es_connect import ElasticBulk, ElasticWrap, IndexPaginate
 from common.src.helper import (
     get_channel_overwrites,
     get_playlists,
     ignore_filelist,
     rand_sleep,
 )
-from common.src.ta_redis import RedisQueue
+from common.src.rate_limit import RateLimiter
+from common.src.ta_redis import RedisQueue, StatsCache
 from common.src.urlparser import ParsedURLType
 from download.src.queue import PendingList
+from download.src.queue_interact import PendingQueue
 from download.src.yt_dlp_base import YtWrap
 from playlist.src.index import YoutubePlaylist
 from video.src.comments import CommentList
 from video.src.constants import VideoTypeEnum
 from video.src.index import YoutubeVideo, index_new_video
+from video.src.subtitle import YoutubeSubtitle
 
 
 class DownloaderBase:
@@ -50,19 +55,87 @@ class DownloaderBase:
 class VideoDownloader(DownloaderBase):
     """handle the video download functionality"""
 
+    MAX_WORKERS = 8
+
     def __init__(self, task=False):
         super().__init__(task)
         self.obs = False
+        self.queue = PendingQueue()
+        self.bulk = ElasticBulk(max_actions=20, max_age=60, refresh=True)
+        self.subtitle_bulk = YoutubeSubtitle.new_bulk()
+        self.workers = self._get_workers()
+        self.limiter = RateLimiter.for_host(
+            YtWrap.RATE_LIMIT_HOST,
+            self.config["downloads"].get("requests_per_minute"),
+        )
         self._build_obs()
 
+    def _get_workers(self) -> int:
+        """get number of parallel download slots"""
+        workers = self.config["downloads"].get("parallel_downloads") or 1
+        return max(1, min(workers, self.MAX_WORKERS))
+
     def run_queue(self, auto_only=False) -> tuple[int, int]:
         """setup download queue in redis loop until no more items"""
+        self.queue.clear()
+        try:
+            downloaded, failed = self._run_workers(auto_only)
+        finally:
+            self.bulk.flush()
+            self.subtitle_bulk.flush()
+            self.queue.clear()
+            self._notify_bulk_failed()
+
+        self._reset_auto()
+
+        # post processing
+        DownloadPostProcess(self.task).run()
+
+        return downloaded, failed
+
+    def _run_workers(self, auto_only) -> tuple[int, int]:
+        """run download loop in parallel slots sharing the queue"""
+        abort = threading.Event()
+        if self.workers == 1:
+            return self._run_loop(auto_only, abort)
+
+        print(f"[download] start {self.workers} parallel download slots")
+        request = self.task.request if self.task else None
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(self._run_slot, auto_only, abort, request)
+                for _ in range(self.workers)
+            ]
+
+        # raises first failed slot
+        results = [future.result() for future in futures]
+        downloaded = sum(i[0] for i in results)
+        failed = sum(i[1] for i in results)
+
+        return downloaded, failed
+
+    def _run_slot(self, auto_only, abort, request) -> tuple[int, int]:
+        """run loop in worker thread, abort other slots on error"""
+        if request:
+            # task request context is thread local
+            self.task.request_stack.push(request)
+
+        try:
+            return self._run_loop(auto_only, abort)
+        except Exception:
+            abort.set()
+            raise
+        finally:
+            if request:
+                self.task.request_stack.pop()
+
+    def _run_loop(self, auto_only, abort) -> tuple[int, int]:
+        """claim items from queue until empty, stopped or aborted"""
         downloaded = 0
         failed = 0
-        while True:
-            video_data = self._get_next(auto_only)
+        while not abort.is_set():
+            video_data = self.queue.get_next(auto_only)
             if self.task.is_stopped() or not video_data:
-                self._reset_auto()
                 break
 
             if downloaded > 0:
@@ -72,6 +145,7 @@ class VideoDownloader(DownloaderBase):
             channel_id = video_data["channel_id"]
             print(f"{youtube_id}: Downloading video")
             self._notify(video_data, "Validate download format")
+            self.limiter.wait()
 
             success = self._dl_single_vid(youtube_id, channel_id)
             if not success:
@@ -79,53 +153,74 @@ class VideoDownloader(DownloaderBase):
                 continue
 
             self._notify(video_data, "Add video metadata to index", progress=1)
-            video_type = VideoTypeEnum(video_data["vid_type"])
-            vid_dict = index_new_video(youtube_id, video_type=video_type)
+            vid_dict = self._index_video(video_data)
+            if not vid_dict:
+                failed += 1
+                continue
+
             RedisQueue(self.CHANNEL_QUEUE).add(channel_id)
             RedisQueue(self.VIDEO_QUEUE).add(youtube_id)
 
             self._notify(video_data, "Move downloaded file to archive")
             self.move_to_archive(vid_dict)
             self._delete_from_pending(youtube_id)
+            # media file is archived, write pending delete and subtitles now
+            self.bulk.flush()
+            self.subtitle_bulk.flush()
             downloaded += 1
 
-        # post processing
-        DownloadPostProcess(self.task).run()
-
         return downloaded, failed
 
+    def _index_video(self, video_data) -> dict | None:
+        """write video to index, None and keep pending if failed"""
+        youtube_id = video_data["youtube_id"]
+        video_bulk = ElasticBulk(refresh=True)
+        vid_dict = index_new_video(
+            youtube_id,
+            video_type=VideoTypeEnum(video_data["vid_type"]),
+            bulk=video_bulk,
+            subtitle_bulk=self.subtitle_bulk,
+        )
+        failed = video_bulk.flush()
+        if failed:
+            print(f"{youtube_id}: failed to add video to index: {failed}")
+            self.bulk.failed.extend(failed)
+            self._handle_error(youtube_id, "failed to add video to index")
+            return None
+
+        return vid_dict
+
     def _notify(self, video_data, message, progress=False):
         """send progress notification to task"""
         if not self.task:
             return
 
         typ = VideoTypeEnum(video_data["vid_type"]).value.rstrip("s").title()
-        title = video_data.get("title")
+        title = self._tag(video_data["youtube_id"], video_data.get("title"))
         self.task.send_progress(
             [f"Processing {typ}: {title}", message], progress=progress
         )
 
-    def _get_next(self, auto_only):
-        """get next item in queue"""
-        must_list = [{"term": {"status": {"value": "pending"}}}]
-        must_not_list = [{"exists": {"field": "message"}}]
-        if auto_only:
-            must_list.append({"term": {"auto_start": {"value": True}}})
+    def _tag(self, youtube_id: str, title: str) -> str:
+        """tag title with video id if slots share the progress message"""
+        if self.workers == 1:
+            return title
 
-        data = {
-            "size": 1,
-            "query": {"bool": {"must": must_list, "must_not": must_not_list}},
-            "sort": [
-                {"auto_start": {"order": "desc"}},
-                {"timestamp": {"order": "asc"}},
-            ],
-        }
-        path = "ta_download/_search"
-        response, _ = ElasticWrap(path).get(data=data)
-        if not response["hits"]["hits"]:
-            return False
+        return f"[{youtube_id}] {title}"
 
-        return response["hits"]["hits"][0]["_source"]
+    def _notify_bulk_failed(self):
+        """report items failed to write to index"""
+        if not self.bulk.failed:
+            return
+
+        failed_ids = [str(i.get("_id")) for i in self.bulk.failed]
+        message_lines = [
+            "Writing downloaded videos to index failed.",
+            f"Failed Videos: {','.join(failed_ids)}",
+        ]
+        print(message_lines)
+        if self.task:
+            self.task.send_progress(message_lines, level="error")
 
     def _progress_hook(self, response):
         """process the progress_hooks from yt_dlp"""
@@ -144,7 +239,8 @@ class VideoDownloader(DownloaderBase):
             message = "processing"
 
         if self.task:
-            title = response["info_dict"]["title"]
+            info_dict = response["info_dict"]
+            title = self._tag(info_dict["id"], info_dict["title"])
             self.task.send_progress([title, message], progress=progress)
 
     def _build_obs(self):
@@ -167,7 +263,7 @@ class VideoDownloader(DownloaderBase):
         }
 
     def _build_obs_user(self):
-        """build user customized options"""
+        """build user customized options, rates are split between slots"""
         if self.config["downloads"]["format"]:
             self.obs["format"] = self.config["downloads"]["format"]
         if self.config["downloads"]["format_sort"]:
@@ -176,12 +272,12 @@ class VideoDownloader(DownloaderBase):
             self.obs["format_sort"] = format_sort_list
         if self.config["downloads"]["limit_speed"]:
             self.obs["ratelimit"] = (
-                self.config["downloads"]["limit_speed"] * 1024
+                self.config["downloads"]["limit_speed"] * 1024 // self.workers
             )
 
         throttle = self.config["downloads"]["throttledratelimit"]
         if throttle:
-            self.obs["throttledratelimit"] = throttle * 1024
+            self.obs["throttledratelimit"] = throttle * 1024 // self.workers
 
     def _build_obs_postprocessors(self):
         """add postprocessor to obs"""
@@ -216,19 +312,22 @@ class VideoDownloader(DownloaderBase):
 
         if self.obs["writethumbnail"]:
             # webp files don't get cleaned up automatically
+            # only own files, other slots may still write to the cache
             all_cached = ignore_filelist(os.listdir(dl_cache))
-            to_clean = [i for i in all_cached if not i.endswith(".mp4")]
+            to_clean = [
+                i
+                for i in all_cached
+                if i.startswith(f"{youtube_id}.") and not i.endswith(".mp4")
+            ]
             for file_name in to_clean:
                 file_path = os.path.join(dl_cache, file_name)
                 os.remove(file_path)
 
         return success
 
-    @staticmethod
-    def _handle_error(youtube_id, message):
+    def _handle_error(self, youtube_id, message):
         """store error message"""
-        data = {"doc": {"message": message}}
-        _, _ = ElasticWrap(f"ta_download/_update/{youtube_id}").post(data=data)
+        self.bulk.update("ta_download", youtube_id, {"message": message})
 
     def move_to_archive(self, vid_dict):
         """move downloaded video from cache to archive"""
@@ -239,7 +338,7 @@ class VideoDownloader(DownloaderBase):
             self.MEDIA_DIR, vid_dict["channel"]["channel_id"]
         )
         if not os.path.exists(folder):
-            os.makedirs(folder)
+            os.makedirs(folder, exist_ok=True)
             if host_uid and host_gid:
                 os.chown(folder, host_uid, host_gid)
         # move media file
@@ -251,11 +350,9 @@ class VideoDownloader(DownloaderBase):
         if host_uid and host_gid:
             os.chown(new_path, host_uid, host_gid)
 
-    @staticmethod
-    def _delete_from_pending(youtube_id):
+    def _delete_from_pending(self, youtube_id):
         """delete downloaded video from pending index if its there"""
-        path = f"ta_download/_doc/{youtube_id}?refresh=true"
-        _, _ = ElasticWrap(path).delete()
+        self.bulk.delete("ta_download", youtube_id)
 
     def _reset_auto(self):
         """reset autostart to defaults after queue stop"""
@@ -286,6 +383,7 @@ class DownloadPostProcess(DownloaderBase):
         self.embed_metadata()
 
         RedisQueue(self.VIDEO_QUEUE).clear()
+        StatsCache.invalidate()
 
     def auto_delete_all(self):
         """handle auto delete"""
@@ -108,3 +108,23 @@ class BiggestChannelItemSerializer(serializers.Serializer):
     duration = serializers.IntegerField()
     duration_str = serializers.CharField()
     media_size = serializers.IntegerField()
+
+
+class StatsAllSerializer(serializers.Serializer):
+    """serialize combined dashboard stats"""
+
+    video = VideoStatsSerializer(allow_null=True)
+    channel = ChannelStatsSerializer(allow_null=True)
+    playlist = PlaylistStatsSerializer(allow_null=True)
+    download = DownloadStatsSerializer(allow_null=True)
+    watch = WatchStatsSerializer(allow_null=True)
+    download_hist = DownloadHistItemSerializer(many=True, allow_null=True)
+    biggest_channels_doc_count = BiggestChannelItemSerializer(
+        many=True, allow_null=True
+    )
+    biggest_channels_duration = BiggestChannelItemSerializer(
+        many=True, allow_null=True
+    )
+    biggest_channels_media_size = BiggestChannelItemSerializer(
+        many=True, allow_null=True
+    )
@@ -1,8 +1,15 @@
 """aggregations"""
 
+import json
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
 from common.src.env_settings import EnvironmentSettings
 from common.src.es_connect import ElasticWrap
 from common.src.helper import get_duration_str
+from common.src.ta_redis import StatsCache
 from django.conf import settings
 
 
@@ -12,10 +19,44 @@ class AggBase:
     path: str = ""
     data: dict = {}
     name: str = ""
+    cache_expire: int = 60 * 10
+    prefetched: dict | None = None
+
+    @property
+    def cache_key(self) -> str:
+        """key for StatsCache"""
+        return self.name
+
+    @property
+    def msearch_data(self) -> dict:
+        """search body of first get call, for _msearch"""
+        return self.data
+
+    def get_cached(self):
+        """get result from cache, None if not cached"""
+        return StatsCache.get(self.cache_key)
+
+    def set_cached(self, response) -> None:
+        """store result in cache"""
+        if response is not None:
+            StatsCache.set(self.cache_key, response, self.cache_expire)
+
+    def cached(self):
+        """process with cache"""
+        response = self.get_cached()
+        if response is None:
+            response = self.process()
+            self.set_cached(response)
+
+        return response
 
     def get(self):
-        """make get call"""
-        response, _ = ElasticWrap(self.path).get(self.data)
+        """make get call, use prefetched response once if available"""
+        if self.prefetched is not None:
+            response, self.prefetched = self.prefetched, None
+        else:
+            response, _ = ElasticWrap(self.path).get(self.data)
+
         if settings.DEBUG:
             print(
                 f"[agg][{self.name}] took {response.get('took')} ms to process"
@@ -166,6 +207,7 @@ class Download(AggBase):
     """get downloads queue stats"""
 
     name = "download_queue_stats"
+    cache_expire = 60
     path = "ta_download/_search"
     data = {
         "size": 0,
@@ -269,7 +311,9 @@ class WatchProgress(AggBase):
 
 
 class DownloadHist(AggBase):
-    """get downloads histogram last week"""
+    """get downloads histogram last week
+    completed days are cached as daily rollup, only today is live
+    """
 
     name = "videos_last_week"
     path = "ta_video/_search"
@@ -301,7 +345,42 @@ class DownloadHist(AggBase):
     }
 
     def process(self):
-        """process query"""
+        """combine live today with rollup of previous days"""
+        today = self._get_buckets({"gte": "now/d"})
+        if today is None:
+            return None
+
+        return today + self._get_rollup()
+
+    @property
+    def msearch_data(self) -> dict:
+        """today only, previous days from rollup"""
+        return self._build_data({"gte": "now/d"})
+
+    def get_cached(self):
+        """rollup is cached, today is always live"""
+        return None
+
+    def set_cached(self, response) -> None:
+        """rollup is cached in _get_rollup"""
+
+    def _get_rollup(self) -> list[dict]:
+        """get previous days, aggregate once per day"""
+        tz = ZoneInfo(EnvironmentSettings.TZ)
+        day = datetime.now(tz).strftime("%Y-%m-%d")
+        key = f"{self.name}:{day}"
+        rollup = StatsCache.get(key)
+        if rollup is None:
+            date_range = {"gte": "now-7d/d", "lt": "now/d"}
+            rollup = self._get_buckets(date_range) or []
+            # completed days only change on delete, not on new downloads
+            StatsCache.set(key, rollup, expire=60 * 60 * 24, rollup=True)
+
+        return rollup
+
+    def _get_buckets(self, date_range: dict) -> list[dict] | None:
+        """get buckets of date_range"""
+        self.data = self._build_data(date_range)
         aggregations = self.get()
         if not aggregations:
             return None
@@ -319,11 +398,20 @@ class DownloadHist(AggBase):
 
         return response
 
+    def _build_data(self, date_range: dict) -> dict:
+        """build search body for date_range"""
+        data = deepcopy(self.data)
+        date_range = {**date_range, "time_zone": EnvironmentSettings.TZ}
+        data["query"]["range"]["date_downloaded"] = date_range
+
+        return data
+
 
 class BiggestChannel(AggBase):
     """get channel aggregations"""
 
     def __init__(self, order):
+        self.data = deepcopy(self.data)
         self.data["aggs"][self.name]["multi_terms"]["order"] = {order: "desc"}
 
     name = "channel_stats"
@@ -349,6 +437,12 @@ class BiggestChannel(AggBase):
     }
     order_choices = ["doc_count", "duration", "media_size"]
 
+    @property
+    def cache_key(self) -> str:
+        """cache per order"""
+        order = self.data["aggs"][self.name]["multi_terms"]["order"]
+        return f"{self.name}:{next(iter(order))}"
+
     def process(self):
         """process aggregation, order_by validated in the view"""
 
@@ -371,3 +465,81 @@ class BiggestChannel(AggBase):
         ]
 
         return response
+
+
+class StatsAll:
+    """combined dashboard stats
+    send uncached aggregations as single _msearch, parse concurrently
+    """
+
+    def __init__(self):
+        self.aggs: dict[str, AggBase] = {
+            "video": Video(),
+            "channel": Channel(),
+            "playlist": Playlist(),
+            "download": Download(),
+            "watch": WatchProgress(),
+            "download_hist": DownloadHist(),
+        }
+        for order in BiggestChannel.order_choices:
+            self.aggs[f"biggest_channels_{order}"] = BiggestChannel(order)
+
+    def process(self) -> dict:
+        """get all stats"""
+        response = {}
+        to_fetch = {}
+        for key, agg in self.aggs.items():
+            cached = agg.get_cached()
+            if cached is None:
+                to_fetch[key] = agg
+            else:
+                response[key] = cached
+
+        if to_fetch:
+            self._msearch(list(to_fetch.values()))
+            response.update(self._process_all(to_fetch))
+
+        return response
+
+    @staticmethod
+    def _msearch(aggs: list[AggBase]) -> None:
+        """prefetch responses of all aggs in one request"""
+        lines = []
+        for agg in aggs:
+            index_name = agg.path.split("/")[0]
+            lines.append(json.dumps({"index": index_name}))
+            lines.append(json.dumps(agg.msearch_data))
+
+        # add last newline
+        lines.append("\n")
+        query_str = "\n".join(lines)
+        response, status_code = ElasticWrap("_msearch").post(
+            query_str, ndjson=True
+        )
+        if status_code != 200:
+            print(f"[agg] msearch failed: {response}")
+            return
+
+        for agg, agg_response in zip(aggs, response["responses"]):
+            if "error" in agg_response:
+                print(f"[agg][{agg.name}] failed: {agg_response['error']}")
+                agg_response = {}
+
+            agg.prefetched = agg_response
+
+    @staticmethod
+    def _process_all(to_fetch: dict[str, AggBase]) -> dict:
+        """run process of aggs concurrently, cache results"""
+        with ThreadPoolExecutor(max_workers=len(to_fetch)) as executor:
+            futures = {
+                key: executor.submit(agg.process)
+                for key, agg in to_fetch.items()
+            }
+
+        response = {}
+        for key, future in futures.items():
+            result = future.result()
+            to_fetch[key].set_cached(result)
+            response[key] = result
+
+        return response
@@ -39,4 +39,9 @@ urlpatterns = [
         views.StatBiggestChannel.as_view(),
         name="api-stats-biggestchannels",
     ),
+    path(
+        "all/",
+        views.StatAllView.as_view(),
+        name="api-stats-all",
+    ),
 ]
@@ -11,6 +11,7 @@ from stats.serializers import (
     DownloadHistItemSerializer,
     DownloadStatsSerializer,
     PlaylistStatsSerializer,
+    StatsAllSerializer,
     VideoStatsSerializer,
     WatchStatsSerializer,
 )
@@ -20,6 +21,7 @@ from stats.src.aggs import (
     Download,
     DownloadHist,
     Playlist,
+    StatsAll,
     Video,
     WatchProgress,
 )
@@ -34,7 +36,7 @@ class StatVideoView(ApiBaseView):
     def get(self, request):
         """get video stats"""
         # pylint: disable=unused-argument
-        serializer = VideoStatsSerializer(Video().process())
+        serializer = VideoStatsSerializer(Video().cached())
 
         return Response(serializer.data)
 
@@ -48,7 +50,7 @@ class StatChannelView(ApiBaseView):
     def get(self, request):
         """get channel stats"""
         # pylint: disable=unused-argument
-        serializer = ChannelStatsSerializer(Channel().process())
+        serializer = ChannelStatsSerializer(Channel().cached())
 
         return Response(serializer.data)
 
@@ -62,7 +64,7 @@ class StatPlaylistView(ApiBaseView):
     def get(self, request):
         """get playlist stats"""
         # pylint: disable=unused-argument
-        serializer = PlaylistStatsSerializer(Playlist().process())
+        serializer = PlaylistStatsSerializer(Playlist().cached())
 
         return Response(serializer.data)
 
@@ -76,7 +78,7 @@ class StatDownloadView(ApiBaseView):
     def get(self, request):
         """get download stats"""
         # pylint: disable=unused-argument
-        serializer = DownloadStatsSerializer(Download().process())
+        serializer = DownloadStatsSerializer(Download().cached())
 
         return Response(serializer.data)
 
@@ -90,7 +92,7 @@ class StatWatchProgress(ApiBaseView):
     def get(self, request):
         """get watched stats"""
         # pylint: disable=unused-argument
-        serializer = WatchStatsSerializer(WatchProgress().process())
+        serializer = WatchStatsSerializer(WatchProgress().cached())
 
         return Response(serializer.data)
 
@@ -104,7 +106,7 @@ class StatDownloadHist(ApiBaseView):
     def get(self, request):
         """get download hist items"""
         # pylint: disable=unused-argument
-        download_items = DownloadHist().process()
+        download_items = DownloadHist().cached()
         serializer = DownloadHistItemSerializer(download_items, many=True)
 
         return Response(serializer.data)
@@ -133,7 +135,21 @@ class StatBiggestChannel(ApiBaseView):
         validated_query = query_serializer.validated_data
         order = validated_query["order"]
 
-        channel_items = BiggestChannel(order).process()
+        channel_items = BiggestChannel(order).cached()
         serializer = BiggestChannelItemSerializer(channel_items, many=True)
 
         return Response(serializer.data)
+
+
+class StatAllView(ApiBaseView):
+    """resolves to /api/stats/all/
+    GET: return all dashboard stats in one response
+    """
+
+    @extend_schema(responses=StatsAllSerializer())
+    def get(self, request):
+        """get all stats"""
+        # pylint: disable=unused-argument
+        serializer = StatsAllSerializer(StatsAll().process())
+
+        return Response(serializer.data)
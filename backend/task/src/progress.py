@@ -0,0 +1,115 @@
+"""
+functionality:
+- publish task progress messages to redis
+- coalesce in flight progress updates to max rate
+"""
+
+import json
+import threading
+from time import monotonic
+
+from common.src.env_settings import EnvironmentSettings
+from common.src.ta_redis import RedisArchivist, TaskRedis
+from task.src.task_config import TASK_CONFIG
+
+
+class ProgressPublisher:
+    """progress channel of a single task with persistent connection
+    in flight updates with 0 < progress < 1 are coalesced to max rate,
+    latest held back update is written once the interval has elapsed,
+    every other message, including the final state, is written right away
+    """
+
+    def __init__(
+        self,
+        task_name: str,
+        task_id: str,
+        rate: float = EnvironmentSettings.PROGRESS_RATE,
+    ):
+        self.task_id = task_id
+        self.base = TASK_CONFIG.get(task_name).copy()
+        self.key = f"message:{self.base.get('group')}:{task_id.split('-')[0]}"
+        self.interval: float = 1 / rate
+        self.redis = RedisArchivist()
+        self.task_result: dict = TaskRedis().get_single(task_id)
+        self.last_sent: float = 0
+        self.pending: dict | None = None
+        self._timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+
+    def send(
+        self, message_lines, progress=False, title=False, level="info"
+    ) -> bool:
+        """write message or hold back if throttled, True if written"""
+        message = self.base.copy()
+        message.update(
+            {
+                "level": level,
+                "id": self.task_id,
+                "messages": message_lines,
+                "progress": progress,
+            }
+        )
+        if title:
+            message["title"] = title
+
+        with self._lock:
+            if self._is_throttled(progress, level):
+                self.pending = message
+                self._schedule()
+                return False
+
+            self._write(message)
+
+        return True
+
+    def flush(self) -> bool:
+        """write held back message, True if there was one"""
+        with self._lock:
+            self._cancel()
+            if not self.pending:
+                return False
+
+            self._write(self.pending)
+
+        return True
+
+    def _schedule(self) -> None:
+        """flush held back message once interval has elapsed"""
+        if self._timer:
+            return
+
+        delay = max(self.interval - (monotonic() - self.last_sent), 0)
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel(self) -> None:
+        """cancel scheduled flush"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def _is_throttled(self, progress, level) -> bool:
+        """check if message can be coalesced"""
+        if level != "info" or isinstance(progress, bool):
+            return False
+
+        if not 0 < progress < 1:
+            return False
+
+        return monotonic() - self.last_sent < self.interval
+
+    def _write(self, message: dict) -> None:
+        """write message and refresh task result in one round trip"""
+        if self.task_result:
+            message["command"] = self.task_result.get("command")
+
+        pipe = self.redis.conn.pipeline(transaction=False)
+        pipe.get(TaskRedis.BASE + self.task_id)
+        pipe.set(self.redis.NAME_SPACE + self.key, json.dumps(message))
+        task_result, _ = pipe.execute()
+
+        self.task_result = json.loads(task_result) if task_result else {}
+        self.last_sent = monotonic()
+        self.pending = None
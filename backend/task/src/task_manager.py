@@ -12,21 +12,17 @@ class TaskManager:
     """manage tasks"""
 
     def get_all_results(self):
-        """return all task results"""
+        """return all task results from registry"""
         handler = TaskRedis()
-        all_keys = handler.get_all()
-        if not all_keys:
-            return False
+        all_results = []
+        for task_name in handler.get_names():
+            all_results.extend(handler.get_by_name(task_name))
 
-        return [handler.get_single(i) for i in all_keys]
+        return all_results or False
 
     def get_tasks_by_name(self, task_name):
         """get all tasks by name"""
-        all_results = self.get_all_results()
-        if not all_results:
-            return False
-
-        return [i for i in all_results if i.get("name") == task_name]
+        return TaskRedis().get_by_name(task_name) or False
 
     def get_task(self, task_id):
         """get single task"""
@@ -34,11 +30,7 @@ class TaskManager:
 
     def is_pending(self, task):
         """check if task_name is pending, pass task object"""
-        tasks = self.get_tasks_by_name(task.name)
-        if not tasks:
-            return False
-
-        return bool([i for i in tasks if i.get("status") == "PENDING"])
+        return bool(TaskRedis().get_pending(task.name))
 
     def is_stopped(self, task_id):
         """check if task_id has received STOP command"""
@@ -48,11 +40,11 @@ class TaskManager:
 
     def get_pending(self, task_name):
         """get all pending tasks of task_name"""
-        tasks = self.get_tasks_by_name(task_name)
-        if not tasks:
-            return False
+        return TaskRedis().get_pending(task_name) or False
 
-        return [i for i in tasks if i.get("status") == "PENDING"]
+    def register(self, task):
+        """add finished task to registry, for tasks without init"""
+        TaskRedis().register(task.request.id, task.name)
 
     def init(self, task):
         """pass task object from bind task to set initial pending message"""
@@ -64,19 +56,20 @@ class TaskManager:
             "name": task.name,
             "task_id": task.request.id,
         }
-        TaskRedis().set_key(task.request.id, message)
+        TaskRedis().register(task.request.id, task.name, message)
 
     def fail_pending(self):
         """
-        mark all pending as failed,
+        mark all pending as failed, full SCAN to include unregistered,
         run at startup to recover from hard reset
         """
-        all_results = self.get_all_results()
+        handler = TaskRedis()
+        all_results = handler.get_many(handler.get_all())
         if not all_results:
             return
 
         for result in all_results:
-            if result.get("status") == "PENDING":
+            if result and result.get("status") == "PENDING":
                 result["status"] = "FAILED"
                 TaskRedis().set_key(result["task_id"], result, expire=True)
 
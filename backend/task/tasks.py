@@ -15,6 +15,7 @@ from appsettings.src.reindex import Reindex, ReindexManual, ReindexPopulate
 from celery import Task, shared_task
 from celery.exceptions import Retry
 from channel.src.index import YoutubeChannel
+from common.src.es_connect import ElasticSession
 from common.src.ta_redis import RedisArchivist
 from common.src.urlparser import ParsedURLType, Parser
 from download.src.queue import PendingList
@@ -22,6 +23,7 @@ from download.src.subscriptions import SubscriptionHandler, SubscriptionScanner
 from download.src.thumbnails import ThumbValidator
 from download.src.yt_dlp_handler import VideoDownloader
 from task.src.notify import Notifications
+from task.src.progress import ProgressPublisher
 from task.src.task_config import TASK_CONFIG
 from task.src.task_manager import TaskManager
 from video.src.meta_embed import MetadataEmbed
@@ -32,9 +34,12 @@ class BaseTask(Task):
 
     # pylint: disable=abstract-method
 
+    _publisher: ProgressPublisher | None = None
+
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         """callback for task failure"""
         print(f"{task_id} Failed callback")
+        self._flush_progress()
         message, key = self._build_message(level="error")
         message.update({"messages": [f"Task failed: {exc}"]})
         RedisArchivist().set_message(key, message, expire=20)
@@ -42,6 +47,7 @@ class BaseTask(Task):
     def on_success(self, retval, task_id, args, kwargs):
         """callback task completed"""
         print(f"{task_id} success callback")
+        self._flush_progress()
         message, key = self._build_message()
         message.update({"messages": ["Task completed"]})
         RedisArchivist().set_message(key, message, expire=5)
@@ -56,24 +62,33 @@ class BaseTask(Task):
     def after_return(self, status, retval, task_id, args, kwargs, einfo):
         """callback after task returns"""
         print(f"{task_id} return callback")
+        print(f"{task_id} es connections: {ElasticSession.stats()}")
+        self._flush_progress()
+        self._publisher = None
+        TaskManager().register(self)
         task_title = TASK_CONFIG.get(self.name).get("title")
         Notifications(self.name).send(task_id, task_title)
 
     def send_progress(
         self, message_lines, progress=False, title=False, level="info"
     ):
-        """send progress message"""
-        message, key = self._build_message(level=level)
-        message.update(
-            {
-                "messages": message_lines,
-                "progress": progress,
-            }
-        )
-        if title:
-            message["title"] = title
+        """send progress message, throttled through task publisher"""
+        self._get_publisher().send(message_lines, progress, title, level)
 
-        RedisArchivist().set_message(key, message)
+    def _get_publisher(self) -> ProgressPublisher:
+        """get progress publisher of current task run"""
+        task_id = self.request.id
+        publisher = self._publisher
+        if publisher is None or publisher.task_id != task_id:
+            publisher = ProgressPublisher(self.name, task_id)
+            self._publisher = publisher
+
+        return publisher
+
+    def _flush_progress(self) -> None:
+        """write held back progress before final message"""
+        if self._publisher is not None:
+            self._publisher.flush()
 
     def _build_message(self, level="info"):
         """build message dict"""
@@ -253,9 +268,12 @@ def run_restore_backup(self, filename):
         return None
 
     manager.init(self)
+    backup = ElasticBackup(task=self)
+    self.send_progress(["Validate backup file"])
+    backup.validate(filename)
     self.send_progress(["Reset your Index"])
     ElasticIndexWrap().reset()
-    ElasticBackup(task=self).restore(filename)
+    backup.restore(filename)
     print("index restore finished")
 
     return f"backup restore completed: {filename}"
@@ -304,7 +322,7 @@ def re_sync_metadata(self):
         return
 
     manager.init(self)
-    MetadataEmbed(task=self).embed()
+    return MetadataEmbed(task=self).embed()
 
 
 @shared_task(bind=True, name="subscribe_to", base=BaseTask)
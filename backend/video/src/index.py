@@ -4,6 +4,7 @@ functionality:
 - index and update in es
 """
 
+import hashlib
 import json
 import os
 from datetime import datetime
@@ -13,6 +14,7 @@ from channel.src import index as ta_channel
 from common.src.env_settings import EnvironmentSettings
 from common.src.helper import get_duration_sec, get_duration_str, randomizor
 from common.src.index_generic import YouTubeItem
+from common.src.ta_redis import StatsCache
 from django.conf import settings
 from download.src.thumbnails import ThumbManager
 from mutagen.mp4 import MP4, MP4MetadataError
@@ -151,9 +153,12 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
     es_path = False
     index_name = "ta_video"
     yt_base = "https://www.youtube.com/watch?v="
+    EMBED_HASH_KEY = "----:com.tubearchivist:ta_hash"
 
-    def __init__(self, youtube_id, video_type=VideoTypeEnum.VIDEOS):
-        super().__init__(youtube_id)
+    def __init__(
+        self, youtube_id, video_type=VideoTypeEnum.VIDEOS, config=None
+    ):
+        super().__init__(youtube_id, config=config)
         self.channel_id = False
         self.video_type = video_type
         self.offline_import = False
@@ -341,6 +346,7 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
         self.del_in_es()
         self.delete_subtitles()
         self.delete_comments()
+        StatsCache.invalidate(rollup=True)
 
     def del_in_playlists(self):
         """remove downloaded in playlist"""
@@ -362,10 +368,10 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
                         playlist.del_video(self.youtube_id)
             playlist.upload_to_es()
 
-    def delete_subtitles(self, subtitles=False):
+    def delete_subtitles(self, subtitles=False, bulk=None):
         """delete indexed subtitles"""
         print(f"{self.youtube_id}: delete subtitles")
-        YoutubeSubtitle(self).delete(subtitles=subtitles)
+        YoutubeSubtitle(self, bulk=bulk).delete(subtitles=subtitles)
 
     def delete_comments(self):
         """delete comments from es"""
@@ -399,8 +405,8 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
         if sponsorblock:
             self.json_data["sponsorblock"] = sponsorblock
 
-    def check_subtitles(self, subtitle_files=False):
-        """optionally add subtitles"""
+    def check_subtitles(self, subtitle_files=False, bulk=None):
+        """optionally add subtitles, pass bulk to buffer indexing"""
         if self.offline_import and subtitle_files:
             indexed = self._offline_subtitles(subtitle_files)
             self.json_data["subtitles"] = indexed
@@ -410,7 +416,7 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
             print(f"{self.youtube_id}: skip subtitle check without metadata")
             return
 
-        handler = YoutubeSubtitle(self)
+        handler = YoutubeSubtitle(self, bulk=bulk)
         subtitles = handler.get_subtitles()
         if subtitles:
             indexed = handler.download_subtitles(relevant_subtitles=subtitles)
@@ -435,38 +441,52 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
 
         return subtitles
 
-    def embed_metadata(self):
-        """embed metadata for video"""
+    def embed_metadata(self, related: dict | None = None) -> bool | None:
+        """
+        embed metadata for video, pass prefetched related docs
+        returns True if written, False if unchanged, None if not embedded
+        """
         if not self.json_data:
             self.get_from_es()
 
         if not self.json_data:
             print(f"{self.youtube_id}: skip embed, video not indexed")
-            return
+            return None
 
-        if self.config["downloads"].get("add_metadata"):
-            try:
-                self._embed_text_data()
-                self._embed_artwork()
-            except MP4MetadataError as err:
-                print(f"{self.youtube_id}: embed failed: '{str(err)}'")
-
-    def _embed_text_data(self):
-        """embed text metadata"""
-        print(f"{self.youtube_id}: embed metadata")
+        if not self.config["downloads"].get("add_metadata"):
+            return None
+
+        try:
+            return self._embed_data(related)
+        except MP4MetadataError as err:
+            print(f"{self.youtube_id}: embed failed: '{str(err)}'")
+
+        return None
+
+    def _embed_data(self, related: dict | None = None) -> bool | None:
+        """embed text metadata and artwork, skip if hash is unchanged"""
         video_base = EnvironmentSettings.MEDIA_DIR
         media_url = self.json_data.get("media_url")
         file_path = os.path.join(video_base, media_url)
         if not os.path.exists(file_path):
             print(f"{self.youtube_id}: skip embed, file not found")
-            return
+            return None
+
+        to_embed = self._get_to_embed(related)
+        thumb_handler = ThumbManager(self.youtube_id)
+        art_paths = thumb_handler.get_video_art_paths(self.json_data)
+        embed_hash = self._get_embed_hash(to_embed, art_paths)
+
+        video = MP4(file_path)
+        embedded_hash = video.get(self.EMBED_HASH_KEY)
+        if embedded_hash and bytes(embedded_hash[0]).decode() == embed_hash:
+            print(f"{self.youtube_id}: skip embed, unchanged")
+            return False
 
+        print(f"{self.youtube_id}: embed metadata and artwork")
         title = self.json_data["title"]
         artist = self.json_data["channel"]["channel_name"]
         description = self.json_data.get("description", "")
-        to_embed = self._get_to_embed()
-
-        video = MP4(file_path)
         video["\xa9nam"] = [title]  # title
         video["\xa9ART"] = [artist]  # artist
         if description:
@@ -474,10 +494,54 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
             video["ldes"] = [description]  # synopsis
 
         video["----:com.tubearchivist:ta"] = [to_embed.encode("utf-8")]
+        thumb_handler.set_video_art(video, art_paths)
+        video[self.EMBED_HASH_KEY] = [embed_hash.encode("utf-8")]
         video.save()
 
-    def _get_to_embed(self) -> str:
-        """get metadata json str to embed"""
+        return True
+
+    @staticmethod
+    def _get_embed_hash(to_embed: str, art_paths: dict[str, str]) -> str:
+        """hash of metadata to embed and size and mtime of artwork"""
+        embed_hash = hashlib.sha256(to_embed.encode("utf-8"))
+        for key, art_path in sorted(art_paths.items()):
+            try:
+                stat = os.stat(art_path)
+                art_stamp = f"{key}:{stat.st_size}:{stat.st_mtime_ns}"
+            except FileNotFoundError:
+                art_stamp = f"{key}:-"
+
+            embed_hash.update(art_stamp.encode("utf-8"))
+
+        return embed_hash.hexdigest()
+
+    def _get_to_embed(self, related: dict | None = None) -> str:
+        """get metadata json str to embed, fetch related if not passed"""
+        if related is None:
+            related = self._get_related()
+
+        subtitles = related["subtitles"]
+        if subtitles:
+            # stable order for embed hash, independent of query
+            subtitles = sorted(
+                subtitles,
+                key=lambda i: (i["subtitle_lang"], i["subtitle_index"]),
+            )
+
+        to_embed = json.dumps(
+            {
+                "video": self.json_data,
+                "comments": related["comments"],
+                "subtitles": subtitles,
+                "playlists": related["playlists"],
+                "version": settings.TA_VERSION,
+            }
+        )
+
+        return to_embed
+
+    def _get_related(self) -> dict:
+        """get comments, subtitles and playlists to embed"""
         comments = None
         if self.json_data.get("comment_count"):
             comments = Comments(self.youtube_id).get_es_comments()
@@ -492,28 +556,26 @@ class YoutubeVideo(YouTubeItem, YoutubeSubtitle):
             for playlist_id in self.json_data["playlist"]:
                 playlist = ta_playlist.YoutubePlaylist(playlist_id)
                 playlist.get_from_es()
-                playlists.append(playlist.json_data)
+                playlists.append(playlist.json_data or False)
 
-        to_embed = json.dumps(
-            {
-                "video": self.json_data,
-                "comments": comments,
-                "subtitles": subtitles,
-                "playlists": playlists,
-                "version": settings.TA_VERSION,
-            }
-        )
-
-        return to_embed
-
-    def _embed_artwork(self):
-        """embed artwork"""
-        print(f"{self.youtube_id}: embed artwork")
-        ThumbManager(self.youtube_id).embed_video_art(self.json_data)
+        return {
+            "comments": comments,
+            "subtitles": subtitles,
+            "playlists": playlists,
+        }
 
 
-def index_new_video(youtube_id, video_type=VideoTypeEnum.VIDEOS):
-    """combined classes to create new video in index"""
+def index_new_video(
+    youtube_id,
+    video_type=VideoTypeEnum.VIDEOS,
+    bulk=None,
+    subtitle_bulk=None,
+):
+    """
+    combined classes to create new video in index
+    pass ElasticBulk as bulk to buffer the upload,
+    subtitle_bulk from YoutubeSubtitle.new_bulk to buffer subtitles
+    """
     from appsettings.src.reindex import Reindex
 
     video = YoutubeVideo(youtube_id, video_type=video_type)
@@ -530,9 +592,12 @@ def index_new_video(youtube_id, video_type=VideoTypeEnum.VIDEOS):
     if not video.json_data:
         raise ValueError("failed to get metadata for " + youtube_id)
 
-    video.check_subtitles()
+    video.check_subtitles(bulk=subtitle_bulk)
     url = video.json_data["vid_thumb_url"]
     ThumbManager(item_id=video.youtube_id).download_video_thumb(url=url)
-    video.upload_to_es()
+    if bulk:
+        bulk.index("ta_video", video.youtube_id, video.json_data)
+    else:
+        video.upload_to_es()
 
     return video.json_data
@@ -1,18 +1,19 @@
 """
 Functionality:
-- bulk metadata embedding
+- bulk metadata embedding, related documents prefetched per page
 - restore from embedded metadata
 """
 
 import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from appsettings.src.config import AppConfig, AppConfigType
 from channel.serializers import ChannelSerializer
 from channel.src.index import YoutubeChannel
 from common.src.env_settings import EnvironmentSettings
-from common.src.es_connect import ElasticWrap, IndexPaginate
+from common.src.es_connect import ElasticBulk, ElasticWrap, IndexPaginate
 from download.src.thumbnails import ThumbManager
 from mutagen.mp4 import MP4, MP4FreeForm
 from playlist.serializers import PlaylistSerializer
@@ -31,26 +32,35 @@ class MetadataEmbed:
     """sync metadata to videos in bulk"""
 
     INDEX_NAME = "ta_video"
+    PAGE_SIZE = 100
 
     def __init__(self, task=False):
         self.task = task
 
     def embed(self):
         """entry point"""
-        data = {
-            "query": {"match_all": {}},
-            "_source": ["youtube_id"],
-        }
+        config = AppConfig().config
+        if not config["downloads"].get("add_metadata"):
+            print("[embed] add_metadata is not enabled, skipping")
+            return "metadata embedding is not enabled"
+
         paginate = IndexPaginate(
             index_name=self.INDEX_NAME,
-            data=data,
-            size=100,
-            callback=MetadataEmbedCallback,
+            data={"query": {"match_all": {}}},
+            size=self.PAGE_SIZE,
             task=self.task,
             total=self._get_total(),
             pit_keep_alive=1000,
         )
-        _ = paginate.get_results()
+        batch = MetadataEmbedBatch(config)
+        with ThreadPoolExecutor(max_workers=batch.WORKERS) as executor:
+            for all_hits in paginate.iter_pages():
+                batch.run(all_hits, executor)
+
+        message = f"embedded {batch.written} files, {batch.skipped} unchanged"
+        print(f"[embed] {message}")
+
+        return message
 
     def _get_total(self):
         """get total documents in index"""
@@ -60,23 +70,102 @@ class MetadataEmbed:
         return response.get("count")
 
 
-class MetadataEmbedCallback:
-    """callback for metadata embed"""
+class MetadataEmbedBatch:
+    """embed page of videos, related documents prefetched for all,
+    mp4 files written by worker pool
+    """
+
+    WORKERS = 4
+
+    def __init__(self, config):
+        self.config = config
+        self.written: int = 0
+        self.skipped: int = 0
+
+    def run(self, all_hits: list[dict], executor) -> None:
+        """embed all videos of page"""
+        videos = [i["_source"] for i in all_hits]
+        comments = self._get_comments(videos)
+        subtitles = self._get_subtitles(videos)
+        playlists = self._get_playlists(videos)
+
+        to_embed = []
+        for json_data in videos:
+            youtube_id = json_data["youtube_id"]
+            related = {
+                "comments": None,
+                "subtitles": None,
+                "playlists": None,
+            }
+            if json_data.get("comment_count"):
+                related["comments"] = comments.get(youtube_id, False)
+
+            if json_data.get("subtitles"):
+                related["subtitles"] = subtitles.get(youtube_id, [])
+
+            if json_data.get("playlist"):
+                related["playlists"] = [
+                    playlists.get(i, False) for i in json_data["playlist"]
+                ]
+
+            to_embed.append((json_data, related))
+
+        for written in executor.map(self._embed_single, to_embed):
+            if written:
+                self.written += 1
+            elif written is False:
+                self.skipped += 1
+
+    def _embed_single(self, item: tuple[dict, dict]) -> bool | None:
+        """embed single video with prefetched related"""
+        json_data, related = item
+        video = YoutubeVideo(json_data["youtube_id"], config=self.config)
+        video.json_data = json_data
+        return video.embed_metadata(related=related)
+
+    @staticmethod
+    def _mget(index_name: str, ids: list[str]) -> dict[str, dict]:
+        """get documents by id, indexed by id"""
+        if not ids:
+            return {}
+
+        data = {"ids": ids}
+        response, _ = ElasticWrap(f"{index_name}/_mget").get(data=data)
+        return {
+            i["_id"]: i["_source"]
+            for i in response.get("docs", [])
+            if i.get("found")
+        }
 
-    def __init__(self, source, index_name, counter=0):
-        self.source = source
-        self.index_name = index_name
-        self.counter = counter
+    def _get_comments(self, videos: list[dict]) -> dict[str, dict]:
+        """get comments of all videos with comments"""
+        ids = [i["youtube_id"] for i in videos if i.get("comment_count")]
+        return self._mget("ta_comment", ids)
 
-    def run(self):
-        """run embed"""
-        for video in self.source:
-            youtube_id = video["_source"]["youtube_id"]
-            YoutubeVideo(youtube_id).embed_metadata()
+    def _get_playlists(self, videos: list[dict]) -> dict[str, dict]:
+        """get all playlists of videos, deduped"""
+        ids = {j for i in videos for j in i.get("playlist") or []}
+        return self._mget("ta_playlist", sorted(ids))
+
+    @staticmethod
+    def _get_subtitles(videos: list[dict]) -> dict[str, list[dict]]:
+        """get subtitles of all videos with subtitles, grouped by video"""
+        ids = [i["youtube_id"] for i in videos if i.get("subtitles")]
+        if not ids:
+            return {}
+
+        data = {"query": {"terms": {"youtube_id": ids}}}
+        subtitles: dict[str, list[dict]] = {}
+        for fragment in IndexPaginate("ta_subtitle", data).iter_hits():
+            subtitles.setdefault(fragment["youtube_id"], []).append(fragment)
+
+        return subtitles
 
 
 class IndexFromEmbed:
-    """restore from embedded metadata, potential untrusted"""
+    """restore from embedded metadata, potential untrusted
+    pass ElasticBulk as bulk to buffer new video and comments upload
+    """
 
     VIDEOS_BASE = EnvironmentSettings.MEDIA_DIR
     CACHE_DIR = EnvironmentSettings.CACHE_DIR
@@ -88,10 +177,13 @@ class IndexFromEmbed:
         file_path: str,
         use_user_conf: bool = True,
         config: AppConfigType | None = None,
+        bulk: ElasticBulk | None = None,
     ):
         self.file_path = file_path
         self.use_user_conf = use_user_conf
         self.config = config
+        self.bulk = bulk
+        self.is_new: bool = False
 
     def run_index(self) -> None | dict:
         """run index"""
@@ -105,10 +197,12 @@ class IndexFromEmbed:
         channel_data_clean = self.index_channel(json_embed)
         video = self.index_video(json_embed, channel_data_clean)
         self.index_subtitles(json_embed, video)
-        self.index_comments(json_embed)
+        self.index_comments(json_embed, video)
         self.restore_artwork(video)
         self.index_playlists(json_embed, video)
         self.archive_video(video)
+        if self.bulk and self.is_new:
+            self.bulk.index("ta_video", video.youtube_id, video.json_data)
 
         return video.json_data
 
@@ -190,7 +284,9 @@ class IndexFromEmbed:
         video.get_from_es()
         if not video.json_data:
             video.json_data = video_data_clean
-            video.upload_to_es()
+            self.is_new = True
+            if not self.bulk:
+                video.upload_to_es()
 
         return video
 
@@ -199,7 +295,7 @@ class IndexFromEmbed:
         channel_id = video.json_data["channel"]["channel_id"]
         folder = os.path.join(self.VIDEOS_BASE, channel_id)
         if not os.path.exists(folder):
-            os.makedirs(folder)
+            os.makedirs(folder, exist_ok=True)
             if self.HOST_UID and self.HOST_GID:
                 os.chown(folder, self.HOST_UID, self.HOST_GID)
 
@@ -313,8 +409,7 @@ class IndexFromEmbed:
             return
 
         art_folder = os.path.dirname(target_path)
-        if not os.path.exists(art_folder):
-            os.mkdir(art_folder)
+        os.makedirs(art_folder, exist_ok=True)
 
         with open(target_path, "wb") as f:
             f.write(bytes(art_item[0]))
@@ -341,6 +436,7 @@ class IndexFromEmbed:
             (i["subtitle_lang"], i["subtitle_source"]) for i in subtitle_data
         }
         subs = YoutubeSubtitle(video)
+        bulk = subs.new_bulk()
         response = subs.get_es_subtitles()
         indexed = {
             (i["subtitle_lang"], i["subtitle_source"]) for i in response
@@ -374,13 +470,13 @@ class IndexFromEmbed:
                     }
                 )
 
-            subtitle_str = parser.get_subtitle_str()
-            query_str = parser.create_bulk_import(to_index)
-            subs.index_subtitle(query_str)
+            subs.index_documents(to_index, bulk)
 
             media_url = subs.get_media_url(lang=embedded_lang)
             dest_path = os.path.join(self.VIDEOS_BASE, media_url)
-            subs.write_subtitle_file(dest_path, subtitle_str)
+            subs.write_subtitle_file(dest_path, parser)
+
+        bulk.flush()
 
     def _process_subtitle(
         self, indexed, embedded_lang, embedded_source
@@ -411,7 +507,7 @@ class IndexFromEmbed:
 
         return False
 
-    def index_comments(self, json_embed):
+    def index_comments(self, json_embed, video):
         """index comments"""
         comment_data = json_embed.get("comments")
         if not comment_data:
@@ -435,4 +531,12 @@ class IndexFromEmbed:
             return
 
         comments.json_data = dict(serializer.data)
+        if self.bulk and self.is_new:
+            comment_count = len(comments.json_data["comment_comments"])
+            video.json_data["comment_count"] = comment_count
+            self.bulk.index(
+                "ta_comment", comments.youtube_id, comments.json_data
+            )
+            return
+
         comments.upload_comments()
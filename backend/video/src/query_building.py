@@ -65,7 +65,8 @@ class QueryBuilder:
         return {"match": {"player.watched": watch == "watched"}}
 
     def _build_continue_must(self):
-        results = RedisArchivist().list_items(f"{self.user_id}:progress:")
+        key = f"{self.user_id}:progress"
+        results = RedisArchivist().list_hash_items(key)
         if not results:
             return None
 
@@ -1,22 +1,26 @@
 """
 functionality:
-- download subtitles
+- download subtitles, concurrent per video with shared session
 - parse subtitles into it's cues
-- index dubtitles
+- index dubtitles, buffered in bulk across languages and videos
 """
 
 import json
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from operator import itemgetter
 from typing import TypedDict
 
 import requests
 from common.src.env_settings import EnvironmentSettings
-from common.src.es_connect import ElasticWrap, IndexPaginate
-from common.src.helper import rand_sleep, requests_headers
-from download.src.yt_dlp_base import CookieHandler
+from common.src.es_connect import ElasticBulk, IndexPaginate
+from common.src.helper import get_ids, rand_sleep, requests_headers
+from common.src.rate_limit import RateLimiter
+from download.src.yt_dlp_base import CookieHandler, YtWrap
+from requests.adapters import HTTPAdapter
 from yt_dlp.utils import orderedSet_from_options
 
 
@@ -30,11 +34,23 @@ class SubtitleCue(TypedDict):
 
 
 class YoutubeSubtitle:
-    """handle video subtitle functionality"""
+    """handle video subtitle functionality
+    pass bulk from new_bulk to share the buffer between videos
+    """
 
-    def __init__(self, video):
+    BULK_MAX_BYTES = 5 * 1024 * 1024
+
+    def __init__(self, video, bulk: ElasticBulk | None = None):
         self.video = video
         self.languages = False
+        self.bulk = bulk
+
+    @classmethod
+    def new_bulk(cls) -> ElasticBulk:
+        """size capped buffer for subtitle fragments"""
+        return ElasticBulk(
+            max_actions=10000, max_age=60, max_bytes=cls.BULK_MAX_BYTES
+        )
 
     def _sub_conf_parse(self):
         """add additional conf values to self"""
@@ -126,28 +142,26 @@ class YoutubeSubtitle:
             f"{self.video.youtube_id}: downloading subtitles: {subtitle_list}"
         )
         videos_base = EnvironmentSettings.MEDIA_DIR
+        bulk = self.bulk or self.new_bulk()
+        fetcher = SubtitleFetcher(self.video.config)
+        all_responses = fetcher.fetch_all(relevant_subtitles)
         indexed = []
-        for subtitle in relevant_subtitles:
-            dest_path = os.path.join(videos_base, subtitle["media_url"])
-            source = subtitle["source"]
-            lang = subtitle.get("lang")
-
-            response_text = self._make_request(subtitle["url"], lang)
+        for subtitle, response_text in zip(relevant_subtitles, all_responses):
             if not response_text:
                 continue
 
+            dest_path = os.path.join(videos_base, subtitle["media_url"])
+            source = subtitle["source"]
+            lang = subtitle.get("lang")
             parser = SubtitleParser(response_text, lang, source)
             parser.process()
             if not parser.all_cues:
-                rand_sleep(self.video.config)
                 continue
 
-            subtitle_str = parser.get_subtitle_str()
-            self.write_subtitle_file(dest_path, subtitle_str)
+            self.write_subtitle_file(dest_path, parser)
             if self.video.config["downloads"]["subtitle_index"]:
                 documents = parser.create_documents(self.video, source)
-                query_str = parser.create_bulk_import(documents)
-                self.index_subtitle(query_str)
+                self.index_documents(documents, bulk)
 
             indexed.append(
                 {
@@ -159,52 +173,20 @@ class YoutubeSubtitle:
                     "url": subtitle["url"],
                 }
             )
-            rand_sleep(self.video.config)
 
-        return indexed
+        if not self.bulk:
+            bulk.flush()
 
-    def _make_request(self, url: str, lang: str | None) -> str | None:
-        """make the request"""
-        request_kwargs: dict = {
-            "timeout": 30,
-            "headers": requests_headers(),
-        }
-        if self.video.config["downloads"].get("cookie_import"):
-            cookie = CookieHandler(self.video.config).get()
-            if cookie:
-                cookies_txt = cookie.read()
-                jar = requests.cookies.RequestsCookieJar()
-                for line in cookies_txt.split("\n"):
-                    words = line.split()
-                    if (len(words) == 7) and (words[0] != "#"):
-                        jar.set(
-                            words[5], words[6], domain=words[0], path=words[2]
-                        )
-
-                request_kwargs["cookies"] = jar
-
-        response = requests.get(url, **request_kwargs)
+        rand_sleep(self.video.config)
 
-        if not response.ok:
-            subtitle_key = f"{self.video.youtube_id}-{lang}"
-            print(f"{subtitle_key}: failed to download subtitle")
-            print(response.text)
-            rand_sleep(self.video.config)
-            return None
-
-        if not response.text:
-            print(f"{subtitle_key}: skip empty subtitle")
-            rand_sleep(self.video.config)
-            return None
-
-        return response.text
+        return indexed
 
-    def write_subtitle_file(self, dest_path, subtitle_str):
-        """write subtitle file to disk"""
+    def write_subtitle_file(self, dest_path, parser):
+        """stream vtt of parsed subtitle to disk"""
         # create folder here for first video of channel
         os.makedirs(os.path.split(dest_path)[0], exist_ok=True)
         with open(dest_path, "w", encoding="utf-8") as subfile:
-            subfile.write(subtitle_str)
+            subfile.writelines(parser.iter_vtt())
 
         host_uid = EnvironmentSettings.HOST_UID
         host_gid = EnvironmentSettings.HOST_GID
@@ -212,9 +194,11 @@ class YoutubeSubtitle:
             os.chown(dest_path, host_uid, host_gid)
 
     @staticmethod
-    def index_subtitle(query_str):
-        """send subtitle to es for indexing"""
-        _, _ = ElasticWrap("_bulk").post(data=query_str, ndjson=True)
+    def index_documents(documents: list[dict], bulk: ElasticBulk) -> None:
+        """add subtitle fragments to bulk buffer"""
+        for document in documents:
+            document_id = document["subtitle_fragment_id"]
+            bulk.index("ta_subtitle", document_id, document)
 
     def delete(self, subtitles=False):
         """delete subtitles from index and filesystem"""
@@ -235,10 +219,133 @@ class YoutubeSubtitle:
                 os.remove(file_path)
             except FileNotFoundError:
                 print(f"{youtube_id}: {file_path} failed to delete")
-        # delete from index
-        path = "ta_subtitle/_delete_by_query?refresh=true"
-        data = {"query": {"term": {"youtube_id": {"value": youtube_id}}}}
-        _, _ = ElasticWrap(path).post(data=data)
+        # delete from index by fragment id, no forced refresh
+        fragment_ids = get_ids(
+            "ta_subtitle",
+            on_key="subtitle_fragment_id",
+            query={"term": {"youtube_id": {"value": youtube_id}}},
+        )
+        bulk = self.bulk or self.new_bulk()
+        for fragment_id in fragment_ids:
+            bulk.delete("ta_subtitle", fragment_id)
+
+        if not self.bulk:
+            bulk.flush()
+
+
+class SubtitleFetcher:
+    """fetch subtitle files of a video concurrently
+    keep-alive session is shared in the process, cookie is only parsed
+    again when changed, cookies set by responses are dropped per run
+    requests share the youtube rate limit, or a default subtitle limit
+    if not configured
+    """
+
+    MAX_PARALLEL = 3
+    TIMEOUT = 30
+    RATE_LIMIT_HOST = "youtube.com:subtitles"
+    DEFAULT_PER_MINUTE = 120
+
+    _session: requests.Session | None = None
+    _pid: int | None = None
+    _cookie_raw: str | None = None
+    _cookie_jar: requests.cookies.RequestsCookieJar | None = None
+    _lock = threading.Lock()
+
+    def __init__(self, config):
+        self.config = config
+        self.limiter = self._get_limiter()
+
+    def _get_limiter(self) -> RateLimiter:
+        """shared youtube limiter if configured, else subtitle default"""
+        per_minute = self.config["downloads"].get("requests_per_minute")
+        if per_minute:
+            return RateLimiter.for_host(YtWrap.RATE_LIMIT_HOST, per_minute)
+
+        return RateLimiter.for_host(
+            self.RATE_LIMIT_HOST, self.DEFAULT_PER_MINUTE
+        )
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """shared keep-alive session of current process"""
+        pid = os.getpid()
+        if cls._session is not None and cls._pid == pid:
+            return cls._session
+
+        with cls._lock:
+            if cls._session is None or cls._pid != pid:
+                adapter = HTTPAdapter(pool_maxsize=cls.MAX_PARALLEL)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.headers.update(requests_headers())
+                cls._session = session
+                cls._pid = pid
+                cls._cookie_raw = None
+                cls._cookie_jar = None
+
+        return cls._session
+
+    def _sync_cookie(self, session: requests.Session) -> None:
+        """reset session cookies to config cookie, parse if changed"""
+        cookie_raw = None
+        if self.config["downloads"].get("cookie_import"):
+            cookie_raw = CookieHandler(self.config).get().read()
+
+        with self._lock:
+            jar = SubtitleFetcher._cookie_jar
+            if jar is None or cookie_raw != SubtitleFetcher._cookie_raw:
+                jar = self._parse_cookie(cookie_raw or "")
+                SubtitleFetcher._cookie_jar = jar
+                SubtitleFetcher._cookie_raw = cookie_raw
+
+            # drop cookies collected from previous responses
+            session.cookies = jar.copy()
+
+    @staticmethod
+    def _parse_cookie(cookies_txt: str) -> requests.cookies.RequestsCookieJar:
+        """parse netscape cookie file into jar"""
+        jar = requests.cookies.RequestsCookieJar()
+        for line in cookies_txt.split("\n"):
+            words = line.split()
+            if (len(words) == 7) and (words[0] != "#"):
+                jar.set(words[5], words[6], domain=words[0], path=words[2])
+
+        return jar
+
+    def fetch_all(self, subtitles: list[dict]) -> list[str | None]:
+        """fetch text of all subtitles, in order, None if failed"""
+        if not subtitles:
+            return []
+
+        session = self.get_session()
+        self._sync_cookie(session)
+        workers = min(self.MAX_PARALLEL, len(subtitles))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(
+                executor.map(lambda i: self._fetch(session, i), subtitles)
+            )
+
+    def _fetch(self, session: requests.Session, subtitle: dict) -> str | None:
+        """fetch single subtitle"""
+        subtitle_key = subtitle["media_url"]
+        self.limiter.wait()
+        try:
+            response = session.get(subtitle["url"], timeout=self.TIMEOUT)
+        except requests.exceptions.RequestException as err:
+            print(f"{subtitle_key}: failed to download subtitle: {err}")
+            return None
+
+        if not response.ok:
+            print(f"{subtitle_key}: failed to download subtitle")
+            print(response.text)
+            return None
+
+        if not response.text:
+            print(f"{subtitle_key}: skip empty subtitle")
+            return None
+
+        return response.text
 
 
 class SubtitleParser:
@@ -314,31 +421,17 @@ class SubtitleParser:
 
         return f"{hours}:{minutes}:{secs}.{millis}"
 
-    def get_subtitle_str(self):
-        """create vtt text str from cues"""
-        subtitle_str = f"WEBVTT\nKind: captions\nLanguage: {self.lang}"
+    def iter_vtt(self):
+        """yield vtt text cue by cue, to write or join"""
+        yield f"WEBVTT\nKind: captions\nLanguage: {self.lang}"
 
         for cue in self.all_cues:
-            stamp = f"{cue.get('start')} --> {cue.get('end')}"
-            cue_text = f"\n\n{cue.get('idx')}\n{stamp}\n{cue.get('text')}"
-            subtitle_str = subtitle_str + cue_text
-
-        return subtitle_str
+            stamp = f"{cue['start']} --> {cue['end']}"
+            yield f"\n\n{cue['idx']}\n{stamp}\n{cue['text']}"
 
-    def create_bulk_import(self, documents):
-        """subtitle lines for es import"""
-        bulk_list = []
-
-        for document in documents:
-            document_id = document.get("subtitle_fragment_id")
-            action = {"index": {"_index": "ta_subtitle", "_id": document_id}}
-            bulk_list.append(json.dumps(action))
-            bulk_list.append(json.dumps(document))
-
-        bulk_list.append("\n")
-        query_str = "\n".join(bulk_list)
-
-        return query_str
+    def get_subtitle_str(self):
+        """create vtt text str from cues"""
+        return "".join(self.iter_vtt())
 
     def create_documents(self, video, source):
         """process documents"""
@@ -0,0 +1,62 @@
+"""tests for subtitle parsing and vtt rendering"""
+
+import json
+from time import perf_counter
+
+import pytest
+from video.src.subtitle import SubtitleParser
+
+
+def _synthetic_track(hours: int = 10, cue_ms: int = 2000) -> str:
+    """build json3 subtitle with one event every cue_ms"""
+    events = [
+        {
+            "tStartMs": start,
+            "dDurationMs": cue_ms,
+            "segs": [{"utf8": f"line {idx}"}],
+        }
+        for idx, start in enumerate(range(0, hours * 3600 * 1000, cue_ms))
+    ]
+    return json.dumps({"events": events})
+
+
+@pytest.mark.parametrize(
+    "ms, expected",
+    [
+        (0, "00:00:00.000"),
+        (1, "00:00:00.001"),
+        (61001, "00:01:01.001"),
+        (3_599_999, "00:59:59.999"),
+        (36_000_000, "10:00:00.000"),
+    ],
+)
+def test_ms_conv(ms, expected):
+    """timestamp formatting"""
+    assert SubtitleParser._ms_conv(ms) == expected
+
+
+def test_subtitle_str():
+    """vtt header and cues"""
+    parser = SubtitleParser(_synthetic_track(hours=1), "en", "user")
+    parser.process()
+    subtitle_str = parser.get_subtitle_str()
+
+    assert subtitle_str.startswith("WEBVTT\nKind: captions\nLanguage: en")
+    assert "\n\n1\n00:00:00.000 --> 00:00:02.000\nline 0" in subtitle_str
+    assert subtitle_str.endswith("00:59:58.000 --> 01:00:00.000\nline 1799")
+
+
+def test_render_long_track():
+    """render 10 hour caption track within generous time bound"""
+    start = perf_counter()
+    parser = SubtitleParser(_synthetic_track(hours=10), "en", "user")
+    parser.process()
+    subtitle_str = parser.get_subtitle_str()
+    duration = perf_counter() - start
+
+    assert len(parser.all_cues) == 18000
+    assert subtitle_str.count(" --> ") == 18000
+    assert "\n\n18000\n09:59:58.000 --> 10:00:00.000\nline 17999" in (
+        subtitle_str
+    )
+    assert duration < 30
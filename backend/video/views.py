@@ -189,9 +189,9 @@ class VideoProgressView(ApiBaseView):
     search_base = "ta_video/_doc/"
 
     @staticmethod
-    def _get_key(user_id: int, video_id: str) -> str:
-        """redis key"""
-        return f"{user_id}:progress:{video_id}"
+    def _get_key(user_id: int) -> str:
+        """redis hash key, holding progress of user by video_id"""
+        return f"{user_id}:progress"
 
     @extend_schema(
         request=VideoProgressUpdateSerializer(),
@@ -214,22 +214,21 @@ class VideoProgressView(ApiBaseView):
             return Response(error.data, status=404)
 
         position = validated_data["position"]
-        key = self._get_key(request.user.id, video_id)
+        key = self._get_key(request.user.id)
         redis_con = RedisArchivist()
         current_progress = (
-            redis_con.get_message_dict(key) or self.response["player"]
+            redis_con.get_hash_message(key, video_id)
+            or self.response["player"]
         )
 
         current_progress.update({"position": position, "youtube_id": video_id})
         watched = self._check_watched(request, video_id, current_progress)
-        if watched:
-            expire = 60
-        else:
-            expire = False
 
         current_progress.update({"watched": watched})
-        if position > 5:
-            redis_con.set_message(key, current_progress, expire=expire)
+        if watched:
+            redis_con.del_hash_message(key, video_id)
+        elif position > 5:
+            redis_con.set_hash_message(key, video_id, current_progress)
 
         response_serializer = PlayerSerializer(current_progress)
 
@@ -255,8 +254,8 @@ class VideoProgressView(ApiBaseView):
     )
     def delete(self, request, video_id):
         """delete progress position"""
-        key = self._get_key(request.user.id, video_id)
-        RedisArchivist().del_message(key)
+        key = self._get_key(request.user.id)
+        RedisArchivist().del_hash_message(key, video_id)
 
         return Response(status=204)
 
@@ -24,6 +24,8 @@ export type AppSettingsConfigType = {
     cookie_import: boolean;
     pot_provider_url: string | null;
     throttledratelimit: number | null;
+    parallel_downloads: number | null;
+    requests_per_minute: number | null;
     extractor_lang: string | null;
     integrate_ryd: boolean;
     integrate_sponsorblock: boolean;
@@ -0,0 +1,26 @@
+import APIClient from '../../functions/APIClient';
+import { BiggestChannelsStatsType } from './loadStatsBiggestChannels';
+import { ChannelStatsType } from './loadStatsChannel';
+import { DownloadStatsType } from './loadStatsDownload';
+import { DownloadHistoryStatsType } from './loadStatsDownloadHistory';
+import { PlaylistStatsType } from './loadStatsPlaylist';
+import { VideoStatsType } from './loadStatsVideo';
+import { WatchProgressStatsType } from './loadStatsWatchProgress';
+
+export type AllStatsType = {
+  video: VideoStatsType;
+  channel: ChannelStatsType;
+  playlist: PlaylistStatsType;
+  download: DownloadStatsType;
+  watch: WatchProgressStatsType;
+  download_hist: DownloadHistoryStatsType;
+  biggest_channels_doc_count: BiggestChannelsStatsType;
+  biggest_channels_duration: BiggestChannelsStatsType;
+  biggest_channels_media_size: BiggestChannelsStatsType;
+};
+
+const loadStatsAll = async () => {
+  return APIClient<AllStatsType>('/api/stats/all/');
+};
+
+export default loadStatsAll;
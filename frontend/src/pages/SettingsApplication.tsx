@@ -48,6 +48,8 @@ const SettingsApplication = () => {
   // Downloads
   const [currentDownloadSpeed, setCurrentDownloadSpeed] = useState<number | null>(null);
   const [currentThrottledRate, setCurrentThrottledRate] = useState<number | null>(null);
+  const [currentParallelDownloads, setCurrentParallelDownloads] = useState<number | null>(null);
+  const [currentRequestsPerMinute, setCurrentRequestsPerMinute] = useState<number | null>(null);
   const [currentScrapingSleep, setCurrentScrapingSleep] = useState<number | null>(null);
   const [currentAutodelete, setCurrentAutodelete] = useState<number | null>(null);
 
@@ -104,6 +106,8 @@ const SettingsApplication = () => {
     // Downloads
     setCurrentDownloadSpeed(appSettingsConfigData?.downloads.limit_speed || null);
     setCurrentThrottledRate(appSettingsConfigData?.downloads.throttledratelimit || null);
+    setCurrentParallelDownloads(appSettingsConfigData?.downloads.parallel_downloads || null);
+    setCurrentRequestsPerMinute(appSettingsConfigData?.downloads.requests_per_minute || null);
     setCurrentScrapingSleep(appSettingsConfigData?.downloads.sleep_interval || null);
     setCurrentAutodelete(appSettingsConfigData?.downloads.autodelete_days || null);
 
@@ -298,6 +302,17 @@ const SettingsApplication = () => {
                       Throttle rate limit restarts a download if the speed falls below the defined
                       limit.
                     </li>
+                    <li>
+                      Parallel downloads runs multiple downloads at the same time, max 8.
+                      <ul>
+                        <li>Speed limit and throttle rate limit are shared between all downloads.</li>
+                        <li>Also sets the number of parallel workers for the metadata refresh.</li>
+                        <li>
+                          Requests per minute limits how often a new download, metadata refresh or
+                          subtitle request to YT can start, shared between all of them.
+                        </li>
+                      </ul>
+                    </li>
                     <li>
                       The sleep interval slows down requests to YT.
                       <ul>
@@ -344,6 +359,32 @@ const SettingsApplication = () => {
                   updateCallback={handleUpdateConfig}
                 />
               </div>
+              <div className="settings-box-wrapper">
+                <div>
+                  <p>Parallel downloads</p>
+                </div>
+                <InputConfig
+                  type="number"
+                  name="downloads.parallel_downloads"
+                  value={currentParallelDownloads}
+                  setValue={setCurrentParallelDownloads}
+                  oldValue={appSettingsConfig.downloads.parallel_downloads}
+                  updateCallback={handleUpdateConfig}
+                />
+              </div>
+              <div className="settings-box-wrapper">
+                <div>
+                  <p>Requests per minute</p>
+                </div>
+                <InputConfig
+                  type="number"
+                  name="downloads.requests_per_minute"
+                  value={currentRequestsPerMinute}
+                  setValue={setCurrentRequestsPerMinute}
+                  oldValue={appSettingsConfig.downloads.requests_per_minute}
+                  updateCallback={handleUpdateConfig}
+                />
+              </div>
               <div className="settings-box-wrapper">
                 <div>
                   <p>Sleep interval</p>
@@ -1,18 +1,6 @@
 import { useEffect, useState } from 'react';
 import SettingsNavigation from '../components/SettingsNavigation';
-import loadStatsVideo, { VideoStatsType } from '../api/loader/loadStatsVideo';
-import loadStatsChannel, { ChannelStatsType } from '../api/loader/loadStatsChannel';
-import loadStatsPlaylist, { PlaylistStatsType } from '../api/loader/loadStatsPlaylist';
-import loadStatsDownload, { DownloadStatsType } from '../api/loader/loadStatsDownload';
-import loadStatsWatchProgress, {
-  WatchProgressStatsType,
-} from '../api/loader/loadStatsWatchProgress';
-import loadStatsDownloadHistory, {
-  DownloadHistoryStatsType,
-} from '../api/loader/loadStatsDownloadHistory';
-import loadStatsBiggestChannels, {
-  BiggestChannelsStatsType,
-} from '../api/loader/loadStatsBiggestChannels';
+import loadStatsAll, { AllStatsType } from '../api/loader/loadStatsAll';
 import OverviewStats from '../components/OverviewStats';
 import VideoTypeStats from '../components/VideoTypeStats';
 import ApplicationStats from '../components/ApplicationStats';
@@ -25,72 +13,28 @@ import { useUserConfigStore } from '../stores/UserConfigStore';
 import { FileSizeUnits } from '../api/actions/updateUserConfig';
 import { ApiResponseType } from '../functions/APIClient';
 
-type DashboardStatsReponses = {
-  videoStats?: ApiResponseType<VideoStatsType>;
-  channelStats?: ApiResponseType<ChannelStatsType>;
-  playlistStats?: ApiResponseType<PlaylistStatsType>;
-  downloadStats?: ApiResponseType<DownloadStatsType>;
-  watchProgressStats?: ApiResponseType<WatchProgressStatsType>;
-  downloadHistoryStats?: ApiResponseType<DownloadHistoryStatsType>;
-  biggestChannelsStatsByCount?: ApiResponseType<BiggestChannelsStatsType>;
-  biggestChannelsStatsByDuration?: ApiResponseType<BiggestChannelsStatsType>;
-  biggestChannelsStatsByMediaSize?: ApiResponseType<BiggestChannelsStatsType>;
-};
-
 const SettingsDashboard = () => {
   const { userConfig } = useUserConfigStore();
 
-  const [response, setResponse] = useState<DashboardStatsReponses>({
-    videoStats: undefined,
-  });
+  const [response, setResponse] = useState<ApiResponseType<AllStatsType>>();
 
-  const { data: videoStats } = response?.videoStats || {};
-  const { data: channelStats } = response?.channelStats || {};
-  const { data: playlistStats } = response?.playlistStats || {};
-  const { data: downloadStats } = response?.downloadStats || {};
-  const { data: watchProgressStats } = response?.watchProgressStats || {};
-  const { data: downloadHistoryStats } = response?.downloadHistoryStats || {};
-  const { data: biggestChannelsStatsByCount } = response?.biggestChannelsStatsByCount || {};
-  const { data: biggestChannelsStatsByDuration } = response?.biggestChannelsStatsByDuration || {};
-  const { data: biggestChannelsStatsByMediaSize } = response?.biggestChannelsStatsByMediaSize || {};
+  const { data: allStats } = response ?? {};
+
+  const videoStats = allStats?.video;
+  const channelStats = allStats?.channel;
+  const playlistStats = allStats?.playlist;
+  const downloadStats = allStats?.download;
+  const watchProgressStats = allStats?.watch;
+  const downloadHistoryStats = allStats?.download_hist;
+  const biggestChannelsStatsByCount = allStats?.biggest_channels_doc_count;
+  const biggestChannelsStatsByDuration = allStats?.biggest_channels_duration;
+  const biggestChannelsStatsByMediaSize = allStats?.biggest_channels_media_size;
 
   useEffect(() => {
     (async () => {
-      const all = await Promise.all([
-        await loadStatsVideo(),
-        await loadStatsChannel(),
-        await loadStatsPlaylist(),
-        await loadStatsDownload(),
-        await loadStatsWatchProgress(),
-        await loadStatsDownloadHistory(),
-        await loadStatsBiggestChannels('doc_count'),
-        await loadStatsBiggestChannels('duration'),
-        await loadStatsBiggestChannels('media_size'),
-      ]);
-
-      const [
-        videoStats,
-        channelStats,
-        playlistStats,
-        downloadStats,
-        watchProgressStats,
-        downloadHistoryStats,
-        biggestChannelsStatsByCount,
-        biggestChannelsStatsByDuration,
-        biggestChannelsStatsByMediaSize,
-      ] = all;
+      const allStatsResponse = await loadStatsAll();
 
-      setResponse({
-        videoStats,
-        channelStats,
-        playlistStats,
-        downloadStats,
-        watchProgressStats,
-        downloadHistoryStats,
-        biggestChannelsStatsByCount,
-        biggestChannelsStatsByDuration,
-        biggestChannelsStatsByMediaSize,
-      });
+      setResponse(allStatsResponse);
     })();
   }, []);
 
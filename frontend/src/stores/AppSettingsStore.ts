@@ -31,6 +31,8 @@ export const useAppSettingsStore = create<AppSettingsState>(set => ({
       cookie_import: false,
       pot_provider_url: null,
       throttledratelimit: null,
+      parallel_downloads: null,
+      requests_per_minute: null,
       extractor_lang: null,
       integrate_ryd: false,
       integrate_sponsorblock: false,